@@ -0,0 +1,99 @@
+#!/usr/bin/python
+
+"""Benchmark @after(...) page latency by page depth.
+
+A scratch table with a NOT NULL two-column sort key and a matching
+index is filled in a scratch schema of an existing ERMrest catalog
+database.  Pages at increasing depths are then fetched with the page
+filters generated by ermpath.page_filter_sql(), using the row-value
+comparison for known NOT NULL keys and the general form used when
+keys may be NULL.  The scratch schema is dropped when done.
+
+   usage: keyset-paging-benchmark.py dsn [rows [page-size]]
+
+The defaults are 2,000,000 rows and pages of 100 rows.  Use a scratch
+catalog, e.g. dsn 'dbname=_ermrest_catalog_1'.
+
+"""
+
+import sys
+import time
+import psycopg2
+
+from ermrest.model import int8_type, text_type
+from ermrest.model.predicate import Value
+from ermrest.ermpath import page_filter_sql
+
+SCHEMA = 'paging_benchmark'
+REPEAT = 5
+
+QUERY = """
+SELECT * FROM (
+SELECT t0."a", t0."b", t0."c" FROM %(s)s.t t0
+) s WHERE (%(page)s) ORDER BY "a" ASC NULLS LAST, "b" ASC NULLS LAST LIMIT %(limit)d
+"""
+
+def setup(conn, nrows):
+    cur = conn.cursor()
+    cur.execute("""
+CREATE SCHEMA %(s)s;
+CREATE TABLE %(s)s.t (
+  a int8 NOT NULL,
+  b text NOT NULL,
+  c text
+);
+INSERT INTO %(s)s.t (a, b, c)
+SELECT i / 10, 'b' || (i %% 10), md5(i::text)
+FROM generate_series(0, %(n)d - 1) s (i);
+CREATE INDEX ON %(s)s.t (a, b);
+ANALYZE %(s)s.t;
+""" % dict(s=SCHEMA, n=nrows)
+    )
+    conn.commit()
+    cur.close()
+
+def boundary(cur, offset):
+    cur.execute('SELECT a, b FROM %s.t ORDER BY a, b OFFSET %d LIMIT 1' % (SCHEMA, offset))
+    a, b = cur.fetchone()
+    return [ Value(str(a)), Value(b) ]
+
+def page_seconds(cur, after, nullables, page_size):
+    sql = QUERY % dict(
+        s=SCHEMA,
+        page=page_filter_sql(['a', 'b'], [False, False], [int8_type, text_type], after, False, nullables),
+        limit=page_size,
+    )
+    elapsed = []
+    for i in range(REPEAT):
+        start = time.time()
+        cur.execute(sql)
+        cur.fetchall()
+        elapsed.append(time.time() - start)
+    return min(elapsed)
+
+def main(dsn, nrows=2000000, page_size=100):
+    conn = psycopg2.connect(dsn=dsn)
+    setup(conn, nrows)
+    try:
+        cur = conn.cursor()
+        print '    page  row-value (ms)  general (ms)'
+        page = 1
+        while page * page_size < nrows:
+            after = boundary(cur, page * page_size - 1)
+            rowvalue = page_seconds(cur, after, [False, False], page_size)
+            general = page_seconds(cur, after, None, page_size)
+            print '%8d  %14.2f  %12.2f' % (page, rowvalue * 1000, general * 1000)
+            page *= 10
+        cur.close()
+    finally:
+        conn.rollback()
+        cur = conn.cursor()
+        cur.execute('DROP SCHEMA %s CASCADE;' % SCHEMA)
+        conn.commit()
+        conn.close()
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.stderr.write(__doc__)
+        sys.exit(1)
+    main(sys.argv[1], *[ int(a) for a in sys.argv[2:] ])
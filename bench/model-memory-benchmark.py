@@ -0,0 +1,143 @@
+#!/usr/bin/python
+
+"""Benchmark memory held by the introspected model of a large catalog.
+
+A synthetic catalog is fed to model.introspect() as canned query
+results, so no database is needed.  By default it has 5,000 tables of
+20 columns, each with a primary key and a foreign key to its
+predecessor.  The growth of process resident size for holding one more
+model version is reported along with introspection time.
+
+   usage: model-memory-benchmark.py [tables [columns-per-table]]
+
+"""
+
+import sys
+import gc
+import time
+import web
+
+from ermrest.model import introspect
+
+def resident_bytes():
+    for line in open('/proc/self/status'):
+        if line.startswith('VmRSS:'):
+            return int(line.split()[1]) * 1024
+    raise ValueError('VmRSS not found in /proc/self/status')
+
+class SyntheticCatalogCursor (object):
+    """Cursor stand-in answering introspection queries for a synthetic catalog."""
+
+    def __init__(self, ntables, ncolumns, tables_per_schema=500):
+        self.ntables = ntables
+        self.ncolumns = ncolumns
+        self.tables_per_schema = tables_per_schema
+        self.rowcount = -1
+        self._rows = iter([])
+
+    def _table(self, i):
+        # new string objects every time, like rows decoded by psycopg2
+        return 'schema%d' % (i // self.tables_per_schema), 'table%d' % i
+
+    def schemas(self):
+        yield ('catalog', '_ermrest', None)
+        for i in range(0, self.ntables, self.tables_per_schema):
+            yield ('catalog', self._table(i)[0], None)
+
+    def tables(self):
+        for i in range(self.ntables):
+            sname, tname = self._table(i)
+            yield ('catalog', sname, tname, 'r', None)
+
+    def columns(self):
+        for i in range(self.ntables):
+            sname, tname = self._table(i)
+            cnames = ['id', 'parent_id'] + [ 'column%d' % j for j in range(2, self.ncolumns) ]
+            defaults = ["nextval('%s_id_seq'::regclass)" % tname] + [ None for j in range(1, self.ncolumns) ]
+            types = [ {'typename': 'int8', 'length': 8} for j in range(2) ] \
+                    + [ {'typename': 'text', 'length': -1} for j in range(2, self.ncolumns) ]
+            notnull = [True] + [ False for j in range(1, self.ncolumns) ]
+            comments = [ None for j in range(self.ncolumns) ]
+            yield ('catalog', sname, tname, 'r', None, cnames, defaults, types, notnull, comments)
+
+    def pkeys(self):
+        for i in range(self.ntables):
+            sname, tname = self._table(i)
+            yield (sname, '%s_pkey' % tname, sname, tname, ['id'], None)
+
+    def fkeys(self):
+        for i in range(1, self.ntables):
+            sname, tname = self._table(i)
+            usname, utname = self._table(i - 1)
+            yield (sname, '%s_parent_fkey' % tname, sname, tname, ['parent_id'], usname, utname, ['id'], 'NO ACTION', 'NO ACTION', None)
+
+    def execute(self, sql, vars=None):
+        if 'pg_is_in_recovery' in sql:
+            # skips the catalog healing and upgrade statements
+            rows = [(True,)]
+        elif 'max(snap_txid)' in sql:
+            rows = [(1,)]
+        elif 'information_schema.tables' in sql or 'information_schema.columns' in sql:
+            rows = [(True,)]
+        elif '_ermrest.model_pseudo' in sql:
+            rows = []
+        elif 'AS column_names' in sql:
+            rows = self.columns()
+        elif 'AS schema_comment' in sql:
+            rows = self.schemas()
+        elif 'AS table_comment' in sql:
+            rows = self.tables()
+        elif 'AS pk_column_names' in sql:
+            rows = self.pkeys()
+        elif 'AS fk_column_names' in sql:
+            rows = self.fkeys()
+        else:
+            # annotations, ACLs, and ACL bindings
+            rows = []
+        rows = list(rows)
+        self.rowcount = len(rows)
+        self._rows = iter(rows)
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        return self._rows.next()
+
+    def fetchone(self):
+        try:
+            return self._rows.next()
+        except StopIteration:
+            return None
+
+    def fetchall(self):
+        return list(self._rows)
+
+def main(ntables=5000, ncolumns=20):
+    web.ctx.ermrest_config = dict()
+    web.ctx.ermrest_model_rights_cache = dict()
+    cur = SyntheticCatalogCursor(ntables, ncolumns)
+
+    start = time.time()
+    first = introspect(cur)
+    elapsed = time.time() - start
+
+    # measure a second version held alongside the first, as in the model
+    # cache, so transient memory freed by the first introspection is reused
+    gc.collect()
+    before = resident_bytes()
+    second = introspect(cur)
+    gc.collect()
+    after = resident_bytes()
+
+    ncols = sum([ len(t.columns) for s in second.schemas.values() for t in s.tables.values() ])
+    print 'tables: %d columns: %d' % (ntables, ncols)
+    print 'introspection: %.2f s' % elapsed
+    print 'resident size per model: %.1f MiB (%d bytes per column)' % (
+        (after - before) / 1048576.0,
+        (after - before) / ncols
+    )
+    return first, second
+
+if __name__ == '__main__':
+    main(*[ int(a) for a in sys.argv[1:] ])
@@ -0,0 +1,87 @@
+#!/usr/bin/python
+
+"""Benchmark key lookup latency with inlined literals and prepared statements.
+
+A scratch table is filled in a scratch schema of an existing ERMrest
+catalog database.  Single row lookups by primary key, wrapped as for
+an application/json entity response, are then timed with the key
+inlined as a literal and with the same query run through
+sanepg2.connection.execute_prepared().  The scratch schema is dropped
+when done.
+
+   usage: prepared-statement-benchmark.py dsn [lookups [rows]]
+
+The defaults are 5000 lookups in 100,000 rows.  Use a scratch catalog,
+e.g. dsn 'dbname=_ermrest_catalog_1'.
+
+"""
+
+import sys
+import time
+import random
+import psycopg2
+
+from ermrest import sanepg2
+
+SCHEMA = 'prepared_benchmark'
+
+QUERY = """SELECT array_to_json(COALESCE(array_agg(row_to_json(q.*)), ARRAY[]::json[]), True)::text FROM (
+SELECT t0."id", t0."name", t0."value" FROM %(s)s.t AS t0
+WHERE (t0."id" = %(key)s)
+) q"""
+
+def setup(conn, nrows):
+    cur = conn.cursor()
+    cur.execute("""
+CREATE SCHEMA %(s)s;
+CREATE TABLE %(s)s.t (
+  id int8 PRIMARY KEY,
+  name text NOT NULL,
+  value float8
+);
+INSERT INTO %(s)s.t (id, name, value)
+SELECT i, md5(i::text), random()
+FROM generate_series(0, %(n)d - 1) s (i);
+ANALYZE %(s)s.t;
+""" % dict(s=SCHEMA, n=nrows)
+    )
+    conn.commit()
+    cur.close()
+
+def lookup_seconds(conn, keys, prepared):
+    cur = conn.cursor()
+    start = time.time()
+    for key in keys:
+        if prepared:
+            conn.execute_prepared(cur, QUERY % dict(s=SCHEMA, key='$1'), ['int8'], ['%d' % key])
+        else:
+            cur.execute(QUERY % dict(s=SCHEMA, key='%d' % key))
+        cur.fetchall()
+        conn.commit()
+    elapsed = time.time() - start
+    cur.close()
+    return elapsed / len(keys)
+
+def main(dsn, nlookups=5000, nrows=100000):
+    conn = psycopg2.connect(dsn=dsn, connection_factory=sanepg2.connection)
+    setup(conn, nrows)
+    try:
+        keys = [ random.randrange(nrows) for i in range(nlookups) ]
+        # warm caches before either measurement
+        lookup_seconds(conn, keys[0:100], False)
+        print 'inlined (ms)  prepared (ms)'
+        inlined = lookup_seconds(conn, keys, False)
+        prepared = lookup_seconds(conn, keys, True)
+        print '%12.3f  %13.3f' % (inlined * 1000, prepared * 1000)
+    finally:
+        conn.rollback()
+        cur = conn.cursor()
+        cur.execute('DROP SCHEMA %s CASCADE;' % SCHEMA)
+        conn.commit()
+        conn.close()
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.stderr.write(__doc__)
+        sys.exit(1)
+    main(sys.argv[1], *[ int(a) for a in sys.argv[2:] ])
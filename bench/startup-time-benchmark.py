@@ -0,0 +1,50 @@
+#!/usr/bin/python
+
+"""Benchmark service startup time in fresh Python processes.
+
+Each run starts a new interpreter, as a new service worker would,
+and times `import ermrest.ermrest_apis` which loads the configuration
+and builds the URL parser and lexer.  Runs are repeated with the
+generated parser and lexer tables shipped with the package and with
+those tables hidden so they must be built in memory.
+
+   usage: startup-time-benchmark.py [runs]
+
+Run this as the service account with its ermrest_config.json, using
+the ermrest package which should be measured on the Python path.
+
+"""
+
+import sys
+import subprocess
+
+CHILD = """
+import sys
+import time
+start = time.time()
+if sys.argv[1] == 'hidden':
+    # a missing module is the same as stale tables to the loaders
+    sys.modules['ermrest.url.url_lextab'] = None
+    sys.modules['ermrest.url.url_parsetab'] = None
+import ermrest.ermrest_apis
+sys.stdout.write('%f\\n' % (time.time() - start))
+"""
+
+def startup_seconds(mode):
+    child = subprocess.Popen(
+        [sys.executable, '-c', CHILD, mode],
+        stdout=subprocess.PIPE
+    )
+    out = child.communicate()[0]
+    if child.returncode != 0:
+        raise ValueError('startup in %s mode failed with status %d' % (mode, child.returncode))
+    return float(out.strip().split('\n')[-1])
+
+def main(runs=10):
+    print 'tables  min (s)  median (s)  max (s)'
+    for mode in ['shipped', 'hidden']:
+        elapsed = sorted([ startup_seconds(mode) for i in range(runs) ])
+        print '%7s  %7.3f  %10.3f  %7.3f' % (mode, elapsed[0], elapsed[len(elapsed) // 2], elapsed[-1])
+
+if __name__ == '__main__':
+    main(*[ int(a) for a in sys.argv[1:] ])
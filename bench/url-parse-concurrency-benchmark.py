@@ -0,0 +1,85 @@
+#!/usr/bin/python
+
+"""Benchmark URL parsing throughput with concurrent request threads.
+
+Each thread parses a mix of ERMrest model URLs as fast as it can.
+Parser actions for a catalog URL look up the catalog and open its
+database connection, so the catalog production is replaced with one
+that sleeps for a simulated round trip instead.  Throughput is reported
+for the shared parse function and for the same function behind one
+process-wide lock, as URL parsing was serialized before.
+
+   usage: url-parse-concurrency-benchmark.py [seconds [io-milliseconds]]
+
+"""
+
+import sys
+import time
+import threading
+import web
+
+from ermrest.url import url_parse_func, ast
+
+URLS = [
+    '/ermrest/catalog/1/schema/S1/table/T1',
+    '/ermrest/catalog/1/schema/S1/table/T1/column/C1/acl/select',
+    '/ermrest/catalog/1/schema/S1/table/T1/key/C1,C2,C3/annotation',
+    '/ermrest/catalog/1/schema/S1/table/T1/foreignkey/Cx,Cy,Cz/reference/S2:T2/C1,C2,C3',
+    '/ermrest/catalog/1/schema/S1/table/T1/annotation/tag%3Aisrd.isi.edu%2C2016%3Avisible-columns',
+]
+
+class SimulatedCatalog (ast.Catalog):
+    """Catalog production stand-in which only waits for a simulated round trip."""
+
+    io_seconds = 0.001
+
+    def __init__(self, catalog_id):
+        time.sleep(self.io_seconds)
+        self.catalog_id = catalog_id
+        self.manager = None
+
+class SimulatedManager (object):
+    def get_http_vary(self):
+        return set()
+
+def run(parse, nthreads, seconds):
+    counts = [ 0 for i in range(nthreads) ]
+    deadline = time.time() + seconds
+
+    def worker(i):
+        # request state consulted by parser actions
+        web.ctx.ermrest_catalog_model = True
+        web.ctx.webauthn2_manager = SimulatedManager()
+        n = 0
+        while time.time() < deadline:
+            parse(URLS[n % len(URLS)])
+            n += 1
+        counts[i] = n
+
+    threads = [ threading.Thread(target=worker, args=(i,)) for i in range(nthreads) ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / float(seconds)
+
+def main(seconds=3.0, io_ms=1.0):
+    ast.Catalog = SimulatedCatalog
+    SimulatedCatalog.io_seconds = io_ms / 1000.0
+
+    lock = threading.Lock()
+    def locked_parse(s):
+        lock.acquire()
+        try:
+            return url_parse_func(s)
+        finally:
+            lock.release()
+
+    print 'threads  locked (parses/s)  per-thread (parses/s)'
+    for nthreads in [1, 2, 4, 8, 16]:
+        locked = run(locked_parse, nthreads, seconds)
+        unlocked = run(url_parse_func, nthreads, seconds)
+        print '%7d  %17.0f  %21.0f' % (nthreads, locked, unlocked)
+
+if __name__ == '__main__':
+    main(*[ float(a) for a in sys.argv[1:] ])
@@ -41,8 +41,13 @@ from collections import OrderedDict
 
 from .exception import *
 
+from . import sanepg2
+from . import versions
 from .registry import get_registry
-from .catalog import get_catalog_factory
+from .catalog import get_catalog_factory, model_cache, rendered_model_cache
+from .warmup import warmer as model_warmer
+from .model.misc import rights_cache
+from .ermpath import sql_cache, cost_admission
 from .util import negotiated_content_type, urlquote, random_name
 
 __all__ = [
@@ -63,6 +68,20 @@ global_env = webauthn2.merge_config(
         }
     )
 
+# setup database connection pool limits
+sanepg2.pools.configure(global_env.get('connection_pool'))
+
+# setup introspected model cache limits
+model_cache.configure(global_env.get('model_cache'))
+rendered_model_cache.configure(global_env.get('model_json_cache'))
+rights_cache.configure(global_env.get('rights_cache'))
+sql_cache.configure(global_env.get('sql_cache'))
+sanepg2.configure_prepared_statements(global_env.get('prepared_statements'))
+cost_admission.configure(global_env.get('cost_admission'))
+
+# setup push-based catalog version tracking
+versions.tracker.configure(global_env.get('version_tracking'))
+
 # setup webauthn2 handler
 webauthn2_manager = webauthn2.Manager()
 
@@ -80,6 +99,10 @@ if catalog_factory_config:
 else:
     catalog_factory = None
 
+# setup model cache warm-up for registered catalogs
+model_warmer.configure(global_env.get('model_warmup'))
+model_warmer.start(registry, catalog_factory, global_env)
+
 # setup logger and web request log helpers
 logger = logging.getLogger('ermrest')
 sysloghandler = SysLogHandler(address='/dev/log', facility=SysLogHandler.LOG_LOCAL1)
@@ -174,6 +197,8 @@ def request_init():
     web.ctx.ermrest_catalog_factory = catalog_factory
     web.ctx.ermrest_config = global_env
     web.ctx.ermrest_catalog_pc = None
+    web.ctx.ermrest_catalog_model = None
+    web.ctx.ermrest_catalog_key = None
     web.ctx.ermrest_change_notify = amqp_notifier.notify if amqp_notifier else lambda : None
     web.ctx.ermrest_model_rights_cache = dict()
 
@@ -265,13 +290,22 @@ def web_method():
                     raise rest.BadRequest(e.message)
                 except UnsupportedMediaType, e:
                     raise rest.UnsupportedMediaType(e.message)
+                except psycopg2.pool.PoolError, e:
+                    raise rest.ServiceUnavailable(e.message)
+                except psycopg2.InterfaceError, e:
+                    raise rest.ServiceUnavailable('Please try again.')
                 except psycopg2.Error, e:
-                    request_trace(u"Postgres error: %s (%s)" % (e.pgerror.decode('utf8'), e.pgcode))
-                    if e.pgcode is not None:
+                    request_trace(u"Postgres error: %s (%s)" % ((e.pgerror or str(e)).decode('utf8'), e.pgcode))
+                    if e.pgcode is None and isinstance(e, psycopg2.OperationalError):
+                        # lost connection without a server error report
+                        raise rest.ServiceUnavailable('Database connection error.')
+                    elif e.pgcode is not None:
                         if e.pgcode[0:2] == '08':
                             raise rest.ServiceUnavailable('Database connection error.')
                         elif e.pgcode[0:2] == '53':
                             raise rest.ServiceUnavailable('Resources unavailable.')
+                        elif e.pgcode == '57014':
+                            raise rest.ServiceUnavailable('Query run time limit exceeded.')
                         elif e.pgcode[0:2] == '40':
                             raise rest.ServiceUnavailable('Transaction aborted.')
                         elif e.pgcode[0:2] == '54':
@@ -284,8 +318,6 @@ def web_method():
                     et, ev, tb = sys.exc_info()
                     web.debug('got exception "%s"' % str(ev), traceback.format_exception(et, ev, tb))
                     raise rest.Conflict( str(e) )
-                except (psycopg2.pool.PoolError, psycopg2.OperationalError), e:
-                    raise rest.ServiceUnavailable(e.message)
                 except Exception, e:
                     et, ev, tb = sys.exc_info()
                     web.debug('got exception "%s"' % str(ev), traceback.format_exception(et, ev, tb))
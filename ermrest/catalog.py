@@ -26,12 +26,17 @@ This module provides catalog management features including:
 import web
 import psycopg2
 import sanepg2
+import random
+import threading
+from collections import OrderedDict
 
 from util import sql_identifier, sql_literal, schema_exists, table_exists, random_name
-from .model import introspect, current_model_version
+from .model import current_model_version
+from .versions import MODEL_CHANGE_EVENT_FUNCTION, tracker as version_tracker
+from .model.snapshot import introspect_recorded, introspect_replayed, introspect_shared, is_overlay_statement, SnapshotMismatch
 from .model.misc import annotatable_classes, hasacls_classes, hasdynacls_classes
 
-__all__ = ['get_catalog_factory']
+__all__ = ['get_catalog_factory', 'model_cache', 'rendered_model_cache']
 
 _POSTGRES_FACTORY = "postgres"
 _SUPPORTED_FACTORY_TYPES = (_POSTGRES_FACTORY)
@@ -163,7 +168,263 @@ WHERE datname = %(dbname)s
             # just in case caller didn't use sanepg2 which resets this already...
             self._dbc.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ)
     
-    
+
+def model_weight(model):
+    """Estimate memory footprint of model as a count of its schemas, tables, columns and constraints."""
+    weight = 0
+    for schema in model.schemas.values():
+        weight += 1
+        for table in schema.tables.values():
+            weight += 1 + len(table.columns) + len(table.uniques) + len(table.fkeys)
+    return weight
+
+class ModelCache (object):
+    """A bounded, thread-safe LRU cache of introspected models.
+
+       Entries are keyed by (catalog key, version).  Caching a new
+       version of a catalog's model drops its older versions, which
+       can no longer be requested.  Least recently used entries are
+       evicted when either max_entries or max_weight is exceeded,
+       where weight is estimated by model_weight().
+
+       With incremental enabled, each entry also keeps the recorded
+       introspection log of its model, from which the next version
+       can be derived.
+
+    """
+    def __init__(self, config=None):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # (catalog, version) -> (model, weight, log)
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.configure(config)
+
+    def configure(self, config=None):
+        """Apply model_cache config settings."""
+        if config is None:
+            config = dict()
+        self.max_entries = config.get('max_entries', 64)
+        self.max_weight = config.get('max_weight')
+        self.snapshot_dir = config.get('snapshot_dir')
+        self.incremental = config.get('incremental', True)
+        self._lock.acquire()
+        try:
+            self._evict()
+        finally:
+            self._lock.release()
+
+    def get(self, key):
+        """Return cached model for key or None."""
+        self._lock.acquire()
+        try:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            # re-insert as most recently used
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[0]
+        finally:
+            self._lock.release()
+
+    def latest_version(self, catalog):
+        """Return version of newest cached model of catalog or None."""
+        self._lock.acquire()
+        try:
+            versions = [ key[1] for key in self._entries if key[0] == catalog ]
+            return max(versions) if versions else None
+        finally:
+            self._lock.release()
+
+    def latest_log(self, catalog):
+        """Return (version, log) of newest cached model of catalog or (None, None)."""
+        self._lock.acquire()
+        try:
+            for key, entry in self._entries.items():
+                if key[0] == catalog and entry[2] is not None:
+                    return key[1], entry[2]
+            return None, None
+        finally:
+            self._lock.release()
+
+    def put(self, key, model, log=None):
+        """Cache model under key, dropping older versions of the same catalog.
+
+           The model is not cached if a newer version is already present.
+           The introspection log is kept only if incremental is enabled.
+        """
+        catalog, version = key
+        weight = model_weight(model)
+        self._lock.acquire()
+        try:
+            for old in list(self._entries):
+                if old[0] == catalog:
+                    if old[1] > version:
+                        # a lagging reader must not displace the current model
+                        return
+                    elif old[1] < version:
+                        self._remove(old)
+                        self.evictions += 1
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (model, weight, log if self.incremental else None)
+            self.weight += weight
+            self._evict()
+        finally:
+            self._lock.release()
+
+    def _remove(self, key):
+        model, weight, log = self._entries.pop(key)
+        self.weight -= weight
+
+    def _evict(self):
+        """Evict least recently used entries to fit budgets.  Caller must hold self._lock."""
+        while len(self._entries) > 1 and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries)
+                or (self.max_weight is not None and self.weight > self.max_weight)
+        ):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._entries.clear()
+            self.weight = 0
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        """Return a dictionary of cache statistics."""
+        self._lock.acquire()
+        try:
+            return dict(
+                entries=len(self._entries),
+                weight=self.weight,
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+            )
+        finally:
+            self._lock.release()
+
+model_cache = ModelCache()
+
+class RenderedModelCache (object):
+    """A bounded, thread-safe LRU cache of serialized model documents.
+
+       Entries are keyed by (catalog key, version, resource key,
+       visibility key) and hold a dictionary of representations,
+       e.g. plain JSON bytes and their gzip encoding.  Caching a new
+       version of a catalog drops renderings of its older versions.
+       Least recently used entries are evicted when either
+       max_entries or max_bytes is exceeded.
+
+    """
+    def __init__(self, config=None):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # key -> representations
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.configure(config)
+
+    def configure(self, config=None):
+        """Apply model_json_cache config settings."""
+        if config is None:
+            config = dict()
+        self.enabled = config.get('enabled', True)
+        self.max_entries = config.get('max_entries', 256)
+        self.max_bytes = config.get('max_bytes', 64 * 1024 * 1024)
+        self._lock.acquire()
+        try:
+            self._evict()
+        finally:
+            self._lock.release()
+
+    def get(self, key, encoding):
+        """Return cached representation of key in encoding or None."""
+        self._lock.acquire()
+        try:
+            entry = self._entries.pop(key, None)
+            if entry is None or encoding not in entry:
+                self.misses += 1
+            else:
+                self.hits += 1
+            if entry is not None:
+                # re-insert as most recently used
+                self._entries[key] = entry
+                return entry.get(encoding)
+            return None
+        finally:
+            self._lock.release()
+
+    def put(self, key, encoding, data):
+        """Cache data as representation of key in encoding."""
+        if not self.enabled:
+            return
+        catalog, version = key[0:2]
+        self._lock.acquire()
+        try:
+            for old in list(self._entries):
+                if old[0] == catalog:
+                    if old[1] > version:
+                        # a lagging reader must not displace current renderings
+                        return
+                    elif old[1] < version:
+                        self._remove(old)
+                        self.evictions += 1
+            entry = self._entries.pop(key, dict())
+            if encoding in entry:
+                self.bytes -= len(entry[encoding])
+            entry[encoding] = data
+            self.bytes += len(data)
+            self._entries[key] = entry
+            self._evict()
+        finally:
+            self._lock.release()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.bytes -= sum([ len(data) for data in entry.values() ])
+
+    def _evict(self):
+        """Evict least recently used entries to fit budgets.  Caller must hold self._lock."""
+        while len(self._entries) > 1 and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries)
+                or (self.max_bytes is not None and self.bytes > self.max_bytes)
+        ):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._entries.clear()
+            self.bytes = 0
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        """Return a dictionary of cache statistics."""
+        self._lock.acquire()
+        try:
+            return dict(
+                entries=len(self._entries),
+                bytes=self.bytes,
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+            )
+        finally:
+            self._lock.release()
+
+rendered_model_cache = RenderedModelCache()
+
 class Catalog (object):
     """Provides basic catalog management.
     """
@@ -174,7 +435,7 @@ class Catalog (object):
     _DATA_VERSION_TABLE_NAME = 'data_version'
 
     # key cache by (str(descriptor), version)
-    MODEL_CACHE = dict()
+    MODEL_CACHE = model_cache
 
     def __init__(self, factory, descriptor, config=None):
         """Initializes the catalog.
@@ -183,6 +444,9 @@ class Catalog (object):
            
            The 'descriptor' is a dictionary containing the connection 
            parameters needed to connect to the backend database.
+           Its optional 'replicas' list names hot-standby copies of
+           the database, each as a descriptor dictionary or a libpq
+           DSN string, which may serve read-only requests.
 
            The 'config' is a full ERMrest config, passed to other
            delegates that might need it.
@@ -194,6 +458,10 @@ class Catalog (object):
         assert descriptor is not None
         self.descriptor = descriptor
         self.dsn = self._serialize_descriptor(descriptor)
+        self.replica_dsns = [
+            replica if isinstance(replica, basestring) else self._serialize_descriptor(replica)
+            for replica in descriptor.get('replicas', [])
+        ]
         self._factory = factory
         self._config = config  # Not sure we need to tuck away the config
 
@@ -204,31 +472,151 @@ class Catalog (object):
            form follows the libpq format.
         """
         if 'type' not in descriptor or descriptor['type'] == self._POSTGRES_REGISTRY:
-            return " ".join([ "%s=%s" % (key, descriptor[key]) for key in descriptor if key != 'type' ])
+            return " ".join([ "%s=%s" % (key, descriptor[key]) for key in descriptor if key not in ('type', 'replicas') ])
         else:
             raise KeyError("Catalog descriptor type not supported: %(type)s" % descriptor)
 
+    def replica_connection(self, min_version=None, key=None):
+        """Return a PooledConnection to a replica that has replayed min_version, or None.
+
+           Replicas are tried in random order to spread the load.  A
+           replica must also see the newest cached model version, since
+           the model cache keeps no older version and a lagging replica
+           would cost a full introspection per request.  The currency
+           check runs in the returned connection's open transaction, so
+           the request sees the same snapshot that passed the check.  A
+           replica that cannot be reached or is too far behind is
+           skipped.
+        """
+        checks = []
+        if min_version is not None:
+            checks.append('txid_visible_in_snapshot(%d, txid_current_snapshot())' % min_version)
+        model_version = self.MODEL_CACHE.latest_version(str(self.descriptor))
+        if model_version is not None:
+            # same visibility rule as current_model_version()
+            checks.append('%d < txid_snapshot_xmin(txid_current_snapshot())' % model_version)
+        dsns = list(self.replica_dsns)
+        random.shuffle(dsns)
+        for dsn in dsns:
+            pc = None
+            try:
+                pc = sanepg2.PooledConnection(dsn, key=key)
+                if not checks:
+                    return pc
+                pc.cur.execute("""
+SELECT %s;
+""" % ' AND '.join(checks))
+                if pc.cur.next()[0]:
+                    # a fresh connection would have a different snapshot
+                    pc.snapshot_pinned = True
+                    return pc
+                pc.conn.rollback()
+            except (psycopg2.pool.PoolError, psycopg2.InterfaceError, psycopg2.OperationalError), e:
+                web.debug(u'skipping catalog replica after error: %s' % unicode(e))
+                if pc is not None and pc.conn is not None:
+                    pc.used_pool.putconn(pc.conn, close=True)
+                    pc.conn = None
+            if pc is not None:
+                pc.final()
+        return None
+
     def get_model_update_version(self, cur):
         cur.execute("""
 SELECT txid_current(); 
 """ % dict(table=self._MODEL_VERSION_TABLE_NAME))
         return cur.next()[0] 
 
-    def get_model(self, cur=None, config=None, private=False):
+    def get_model_change_version(self, cur):
+        """Return the model version recorded by this transaction, or None if unchanged."""
+        cur.execute("""
+SELECT snap_txid FROM _ermrest.%(table)s WHERE snap_txid = txid_current();
+""" % dict(table=self._MODEL_VERSION_TABLE_NAME))
+        row = cur.fetchone()
+        return row[0] if row is not None else None
+
+    def model_changed(self, version):
+        """Record that this process committed model version.
+
+           Tracked versions of this catalog are not trusted until
+           the change is seen, so the client's next request reads its
+           own write even before the change notification arrives.
+        """
+        version_tracker.model_changed(self.dsn, version)
+
+    def mark_overlay_change(self, cur):
+        """Record that this transaction changes only model annotations and ACLs.
+
+           Other processes may then derive the next model version
+           from their cached one by reloading just those overlays.
+        """
+        if table_exists(cur, '_ermrest', 'model_overlay_change'):
+            cur.execute("""
+INSERT INTO _ermrest.model_overlay_change (snap_txid)
+SELECT txid_current()
+WHERE NOT EXISTS (SELECT 1 FROM _ermrest.model_overlay_change WHERE snap_txid = txid_current());
+""")
+
+    def _overlay_only_changes(self, cur, old_version, new_version):
+        """Return True if all model changes after old_version up to new_version were overlay-only."""
+        if not table_exists(cur, '_ermrest', 'model_overlay_change'):
+            return False
+        cur.execute("""
+SELECT NOT EXISTS (
+  SELECT v.snap_txid
+  FROM _ermrest.model_version v
+  LEFT OUTER JOIN _ermrest.model_overlay_change o ON (v.snap_txid = o.snap_txid)
+  WHERE v.snap_txid > %(old)d AND v.snap_txid <= %(new)d
+    AND o.snap_txid IS NULL
+);
+""" % dict(old=old_version, new=new_version))
+        return cur.next()[0]
+
+    def _introspect(self, cur, config, version):
+        """Introspect model, deriving it from a cached version when possible.
+
+           Returns (model, log) where log records the introspection.
+        """
+        cache = self.MODEL_CACHE
+        if cache.incremental and version is not None:
+            old_version, log = cache.latest_log(str(self.descriptor))
+            try:
+                if old_version == version:
+                    # fresh copy of an unchanged model
+                    return introspect_replayed(log, config)
+                elif old_version is not None and old_version < version \
+                     and self._overlay_only_changes(cur, old_version, version):
+                    return introspect_replayed(log, config, cur, is_overlay_statement)
+            except SnapshotMismatch, e:
+                # overlay rows may steer introspection to other statements
+                web.debug(u'ignoring unusable cached model log: %s' % unicode(e))
+                return introspect_recorded(cur, config)
+        if cache.snapshot_dir and version is not None:
+            return introspect_shared(cur, cache.snapshot_dir, self.dsn, version, config)
+        return introspect_recorded(cur, config)
+
+    def get_model(self, cur=None, config=None, private=False, prologue=''):
+        version = None
         if cur is None:
-            cur = web.ctx.ermrest_catalog_pc.cur
+            pc = web.ctx.ermrest_catalog_pc
+            cur = pc.cur
+            if not private and pc.used_pool.dsn == self.dsn \
+               and getattr(web.ctx, 'method', None) in ('GET', 'HEAD'):
+                # a version pushed by the primary saves a query, but it
+                # may lag our snapshot, so writes must see the real one
+                version = version_tracker.model_version(self.dsn)
         if config is None:
             config = self._config
-        cache_key = (str(self.descriptor), current_model_version(cur))
-        model = self.MODEL_CACHE.get(cache_key)
-        if (model is None) or private:
-            model = introspect(cur, config)
-
-            if private:
-                assert self.MODEL_CACHE.get(cache_key) != model
-            
+        if version is None:
+            version = current_model_version(cur, prologue)
+        elif prologue:
+            cur.execute(prologue)
+        cache_key = (str(self.descriptor), version)
+        model = None if private else self.MODEL_CACHE.get(cache_key)
+        if model is None:
+            model, log = self._introspect(cur, config, version)
             if not private:
-                self.MODEL_CACHE[cache_key] = model
+                # introspection reads the version in our own snapshot
+                self.MODEL_CACHE.put((cache_key[0], model.version), model, log)
         return model
     
     def destroy(self):
@@ -392,30 +780,7 @@ EXCEPTION WHEN OTHERS THEN
 END;
 $$ LANGUAGE plpgsql;
 
-CREATE OR REPLACE FUNCTION _ermrest.model_change_event() RETURNS void AS $$
-DECLARE
-
-  resultbool boolean;
-  trigger_txid bigint;
-
-BEGIN
-
-  SELECT txid_current() INTO trigger_txid;
-
-  SELECT EXISTS (SELECT snap_txid
-                 FROM _ermrest.%(table)s
-                 WHERE snap_txid = trigger_txid)
-  INTO resultbool ;
-
-  IF NOT resultbool THEN
-
-    INSERT INTO _ermrest.%(table)s (snap_txid)
-      SELECT trigger_txid ;
-
-  END IF;
-
-END;
-$$ LANGUAGE plpgsql;
+%(model_change_event)s
 
 CREATE OR REPLACE FUNCTION _ermrest.model_change_trigger() RETURNS event_trigger AS $$
 BEGIN
@@ -436,7 +801,7 @@ SELECT _ermrest.model_change_event() ;
 -- )
 -- EXECUTE PROCEDURE model_change_trigger() ;
 
-""" % dict(table=self._MODEL_VERSION_TABLE_NAME)
+""" % dict(table=self._MODEL_VERSION_TABLE_NAME, model_change_event=MODEL_CHANGE_EVENT_FUNCTION)
             )
             
         if not table_exists(cur, '_ermrest', self._DATA_VERSION_TABLE_NAME):
@@ -25,6 +25,10 @@ import urllib
 import csv
 import web
 import json
+import re
+import time
+import threading
+from collections import OrderedDict
 
 from psycopg2._json import JSON_OID, JSONB_OID
 
@@ -92,7 +96,7 @@ def notify_data_change(cur, table):
     for table in tables:
         cur.execute('SELECT _ermrest.data_change_event(%s, %s)' % (sql_literal(table.schema.name), sql_literal(table.name)))
 
-def page_filter_sql(keynames, descendings, types, boundary, is_before):
+def page_filter_sql(keynames, descendings, types, boundary, is_before, nullables=None, talias=None):
     """Return SQL WHERE clause to filter by page boundary.
 
        Keycols, descendings, types, boundary are arrays of length N
@@ -112,14 +116,44 @@ def page_filter_sql(keynames, descendings, types, boundary, is_before):
        is_before: True for '@before(boundary)', False for
          '@after(boundary)'.
 
+       nullables: False for each column known to be NOT NULL in the
+         result set, i.e. enforced by Postgres, or None if unknown.
+
+       talias: table alias to qualify the column names, if any.
+
+       With uniform sort directions over NOT NULL columns and a
+       non-null boundary, a row-value comparison is returned which
+       Postgres can satisfy with an index range scan.  Otherwise,
+       the general form handles mixed directions and NULLs.
+
     """
     assert len(keynames) == len(descendings)
     assert len(keynames) == len(boundary)
-    
-    def helper(keynames, descendings, types, boundary):
+
+    fields = [
+        '%s.%s' % (talias, sql_identifier(k)) if talias else sql_identifier(k)
+        for k in keynames
+    ]
+
+    if nullables is not None \
+       and len(set(descendings)) == 1 \
+       and True not in nullables \
+       and not [ b for b in boundary if b.is_null() ]:
+        return '(%s) %s (%s)' % (
+            ', '.join(fields),
+            { # (descending, is_before)
+                (True,  True):  '>',
+                (True,  False): '<',
+                (False, True):  '<',
+                (False, False): '>',
+            }[(descendings[0], is_before)],
+            ', '.join([ boundary[i].sql_literal(types[i]) for i in range(len(boundary)) ])
+        )
+
+    def helper(fields, descendings, types, boundary):
         # cover non-null/non-null total orderings
         term = '%(field)s %(op)s %(boundary)s' % {
-            'field': sql_identifier(keynames[0]),
+            'field': fields[0],
             'op': { # (descending, is_before)
                 (True,  True):  '>', # field is before boundary descending
                 (True,  False): '<', # field is after boundary descending
@@ -139,22 +173,22 @@ def page_filter_sql(keynames, descendings, types, boundary, is_before):
         ntestkey = (boundary[0].is_null(), descendings[0], is_before)
         if ntestkey in nulltests:
             term += ' OR %(field)s %(ntest)s' % {
-                'field': sql_identifier(keynames[0]),
+                'field': fields[0],
                 'ntest': nulltests[ntestkey],
             }
 
-        if len(keynames) == 1:
+        if len(fields) == 1:
             return term
         else:
             # if row field matches boundary, check secondary sort order
             return '(%s) OR (%s IS NOT DISTINCT FROM %s AND (%s))' % (
                 term,
-                sql_identifier(keynames[0]),
+                fields[0],
                 boundary[0].sql_literal(types[0]) if not boundary[0].is_null() else 'NULL',
-                helper(keynames[1:], descendings[1:], types[1:], boundary[1:])
+                helper(fields[1:], descendings[1:], types[1:], boundary[1:])
             )
 
-    result = helper(keynames, descendings, types, boundary)
+    result = helper(fields, descendings, types, boundary)
     return result
 
 
@@ -188,7 +222,326 @@ def sort_components(sortvec, is_before):
         return (sortvec, revs_parts, norm_parts)
     else:
         return (sortvec, norm_parts, None)
-        
+
+def attribute_shape(epath, attribute, col, base):
+    """Return hashable shape of an (attribute, col, base) projection in epath."""
+    if attribute is True:
+        return True
+    return (
+        attribute.__class__,
+        tuple(attribute.nameparts),
+        unicode(attribute.alias) if attribute.alias is not None else None,
+        # aggregate function and binning parameters, if any
+        tuple([
+            unicode(getattr(attribute, a)) if hasattr(attribute, a) else None
+            for a in ['aggfunc', 'nbins', 'minv', 'maxv']
+        ]),
+        unicode(col.name),
+        base if base != epath else None,
+    )
+
+class SqlTemplate (object):
+    """Generated SQL with slots for literal values.
+
+       The template is generated once from a path, with each literal
+       Value rendered as a marker, and may then be rendered with the
+       literal Values of any path of the same shape, or used as a
+       parameterized statement with one $N parameter per slot.
+
+    """
+    __slots__ = ('parts', 'slots', 'param_sql', 'param_types')
+
+    def __init__(self, values, generate):
+        """Build template from SQL returned by generate() for values of a path."""
+        marker = random_name('ermrest_literal_')
+        slots = [] # (value index, etype) per marker
+
+        def slot_marker(i):
+            def helper(etype):
+                slots.append((i, etype))
+                return '%s%d_' % (marker, len(slots) - 1)
+            return helper
+
+        for i in range(len(values)):
+            values[i].sql_slot = slot_marker(i)
+        try:
+            sql = generate()
+        finally:
+            for v in values:
+                v.sql_slot = None
+
+        parts = re.split('%s([0-9]+)_' % re.escape(marker), sql)
+        self.parts = tuple(parts[0::2])
+        self.slots = tuple([ slots[int(n)] for n in parts[1::2] ])
+
+        sql = [ self.parts[0] ]
+        for n in range(len(self.slots)):
+            sql.append('$%d' % (n + 1))
+            sql.append(self.parts[n + 1])
+        self.param_sql = ''.join(sql)
+        self.param_types = tuple([ etype.sql(basic_storage=True) for i, etype in self.slots ])
+
+    def render(self, values):
+        """Return SQL with literals of values filled into the slots."""
+        sql = [ self.parts[0] ]
+        for (i, etype), part in zip(self.slots, self.parts[1:]):
+            sql.append(values[i].sql_literal(etype))
+            sql.append(part)
+        return ''.join(sql)
+
+    def param_literals(self, values):
+        """Return SQL literals of values for the parameters of param_sql."""
+        return [ values[i].sql_literal(etype) for i, etype in self.slots ]
+
+class SqlCache (object):
+    """A bounded, thread-safe LRU cache of SqlTemplate instances.
+
+       Entries are keyed by (catalog key, model version, roles,
+       content type, limit, path shape), so column enumeration,
+       access decisions, key selection, joins and dynamic ACLs
+       compiled into a template are only reused for the same catalog
+       model version and client role set.  Storing a template for a
+       newer version drops the templates of older versions of the
+       same catalog.  Least recently used entries are evicted when
+       max_entries is exceeded.
+
+    """
+    def __init__(self, config=None):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # key -> SqlTemplate
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.configure(config)
+
+    def configure(self, config=None):
+        """Apply sql_cache config settings."""
+        if config is None:
+            config = dict()
+        self.enabled = config.get('enabled', True)
+        self.max_entries = config.get('max_entries', 4096)
+        self._lock.acquire()
+        try:
+            self._evict()
+        finally:
+            self._lock.release()
+
+    def get(self, key):
+        """Return cached template for key or None."""
+        self._lock.acquire()
+        try:
+            result = self._entries.pop(key, None)
+            if result is None:
+                self.misses += 1
+                return None
+            # re-insert as most recently used
+            self._entries[key] = result
+            self.hits += 1
+            return result
+        finally:
+            self._lock.release()
+
+    def put(self, key, result):
+        """Cache template result for key."""
+        if not self.enabled:
+            return
+        self._lock.acquire()
+        try:
+            self._purge(key[0], key[1])
+            self._entries[key] = result
+            self._evict()
+        finally:
+            self._lock.release()
+
+    def _purge(self, catalog_key, version):
+        """Drop templates for versions of catalog older than version.  Caller must hold self._lock."""
+        for key in list(self._entries.keys()):
+            if key[0] == catalog_key and key[1] < version:
+                del self._entries[key]
+
+    def _evict(self):
+        """Evict least recently used entries to fit budget.  Caller must hold self._lock."""
+        if self.max_entries is None:
+            return
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._entries.clear()
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        """Return a dictionary of cache statistics."""
+        self._lock.acquire()
+        try:
+            return dict(
+                entries=len(self._entries),
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+            )
+        finally:
+            self._lock.release()
+
+# provide a shared cache of generated data path SQL
+sql_cache = SqlCache()
+
+class CostAdmission (object):
+    """Admission control for data queries by planner cost estimate.
+
+       When enabled, each data query is first run through EXPLAIN.
+       Queries estimated above max_cost may only run in a small heavy
+       query lane of heavy_slots concurrent queries per process,
+       waiting at most heavy_wait seconds for a slot.  Queries above
+       reject_cost are refused.  The limits come from the
+       "cost_admission" configuration section, passed to configure():
+
+         enabled: estimate query costs before running them (default False)
+         max_cost: cost above which queries use the heavy lane (default None, unbounded)
+         reject_cost: cost above which queries are refused (default None, unbounded)
+         heavy_slots: concurrent heavy queries per process (default 2)
+         heavy_wait: seconds to wait for a heavy lane slot (default 5)
+         catalogs: { key: { max_cost: C, reject_cost: R }, ... }
+         roles: { role: { max_cost: C, reject_cost: R }, ... }
+
+       Catalog overrides replace the defaults for that catalog ID.
+       Role overrides replace those for clients with the role, and a
+       client with several overridden roles gets the highest limits.
+
+    """
+    def __init__(self, config=None):
+        self._cond = threading.Condition()
+        self.heavy_running = 0
+        self.heavy = 0
+        self.rejected = 0
+        self.busy = 0
+        self.configure(config)
+
+    def configure(self, config=None):
+        """Apply limits from configuration dictionary."""
+        if config is None:
+            config = {}
+        self.enabled = bool(config.get('enabled', False))
+        self.max_cost = self._cost(config.get('max_cost'))
+        self.reject_cost = self._cost(config.get('reject_cost'))
+        self.heavy_slots = int(config.get('heavy_slots', 2))
+        self.heavy_wait = float(config.get('heavy_wait', 5))
+        self.catalog_overrides = dict([
+            (str(k), v) for k, v in config.get('catalogs', {}).items()
+        ])
+        self.role_overrides = config.get('roles', {})
+
+    @staticmethod
+    def _cost(v):
+        return float(v) if v is not None else None
+
+    def limits(self, key=None, roles=()):
+        """Return (max_cost, reject_cost) for catalog key and client roles."""
+        max_cost, reject_cost = self.max_cost, self.reject_cost
+
+        override = self.catalog_overrides.get(str(key), {}) if key is not None else {}
+        max_cost = self._cost(override.get('max_cost', max_cost))
+        reject_cost = self._cost(override.get('reject_cost', reject_cost))
+
+        overrides = [ self.role_overrides[r] for r in roles if r in self.role_overrides ]
+        if overrides:
+            def highest(name, default):
+                costs = [ self._cost(o.get(name, default)) for o in overrides ]
+                return None if None in costs else max(costs)
+            max_cost, reject_cost = highest('max_cost', max_cost), highest('reject_cost', reject_cost)
+
+        return max_cost, reject_cost
+
+    def estimate(self, cur, sql):
+        """Return the planner's total cost estimate for sql."""
+        cur.execute('EXPLAIN (FORMAT JSON) %s' % sql)
+        plan = cur.fetchone()[0]
+        if isinstance(plan, basestring):
+            plan = json.loads(plan)
+        return float(plan[0]['Plan']['Total Cost'])
+
+    def admit(self, cur, sql):
+        """Admit sql for the current request or raise an exception.
+
+           Returns True if sql was admitted to the heavy lane, in
+           which case the caller must call release() once it is done.
+        """
+        if not self.enabled:
+            return False
+
+        pc = getattr(web.ctx, 'ermrest_catalog_pc', None)
+        key = getattr(pc, 'key', None)
+        max_cost, reject_cost = self.limits(key, getattr(web.ctx, 'ermrest_client_roles', ()))
+        if max_cost is None and reject_cost is None:
+            return False
+
+        cost = self.estimate(cur, sql)
+        if reject_cost is not None and cost > reject_cost:
+            self._count('rejected')
+            web.ctx.ermrest_request_trace(u'query cost %.0f rejected above %.0f' % (cost, reject_cost))
+            raise BadData('Estimated query cost %.0f exceeds limit %.0f.' % (cost, reject_cost))
+        if max_cost is None or cost <= max_cost:
+            return False
+
+        if not self._acquire():
+            self._count('busy')
+            web.ctx.ermrest_request_trace(u'query cost %.0f refused with heavy query lane full' % cost)
+            raise rest.ServiceUnavailable('Too many costly queries running, please try again later')
+        self._count('heavy')
+        web.ctx.ermrest_request_trace(u'query cost %.0f admitted to heavy query lane above %.0f' % (cost, max_cost))
+        return True
+
+    def _count(self, name):
+        self._cond.acquire()
+        try:
+            setattr(self, name, getattr(self, name) + 1)
+        finally:
+            self._cond.release()
+
+    def _acquire(self):
+        """Take a heavy lane slot, waiting at most heavy_wait seconds."""
+        deadline = time.time() + self.heavy_wait
+        self._cond.acquire()
+        try:
+            while self.heavy_running >= self.heavy_slots:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.heavy_running += 1
+            return True
+        finally:
+            self._cond.release()
+
+    def release(self):
+        """Return a heavy lane slot taken by admit()."""
+        self._cond.acquire()
+        try:
+            self.heavy_running -= 1
+            self._cond.notify()
+        finally:
+            self._cond.release()
+
+    def stats(self):
+        """Return a dictionary of admission statistics."""
+        self._cond.acquire()
+        try:
+            return dict(
+                heavy_running=self.heavy_running,
+                heavy=self.heavy,
+                rejected=self.rejected,
+                busy=self.busy,
+            )
+        finally:
+            self._cond.release()
+
+# provide shared admission control for data queries
+cost_admission = CostAdmission()
+
 class EntityElem (object):
     """Wrapper for instance of entity table in path.
 
@@ -263,6 +616,20 @@ class EntityElem (object):
 
         return self.keyref.join_sql(refop, '%st%d' % (prefix, ltnum), '%st%d' % (prefix, self.pos))
 
+    def sql_shape(self, values):
+        """Return hashable shape of this element's SQL, appending literal Values to values."""
+        return (
+            self.table.schema.name,
+            self.table.name,
+            self.alias,
+            self.keyref.join_str(self.refop, '..', '.') if self.keyref else None,
+            self.refop,
+            self.keyref_alias,
+            self.context_pos,
+            self.outer_type,
+            tuple([ f.sql_shape(values) for f in self.filters ]),
+        )
+
     def sql_wheres(self, prefix=''):
         """Generate SQL row conditions for filtering this element in the epath.
            
@@ -921,6 +1288,50 @@ class AnyPath (object):
         """
         raise NotImplementedError('sql_get on abstract class ermpath.AnyPath')
 
+    def sql_shape(self, values):
+        """Return hashable shape of the get() query, appending literal Values to values.
+
+           Paths with equal shapes generate the same SQL except for
+           their literal values.  None means the SQL is not cacheable.
+        """
+        return None
+
+    def _sort_paging_shape(self, values):
+        return (
+            tuple([ (unicode(k.keyname), k.descending) for k in self.sort ]) if self.sort is not None else None,
+            tuple([ v.sql_shape(values) for v in self.after ]) if self.after is not None else None,
+            tuple([ v.sql_shape(values) for v in self.before ]) if self.before is not None else None,
+        )
+
+    def _sql_get_generate(self, content_type, limit):
+        return self.sql_get(row_content_type=content_type, limit=limit, dynauthz=True)
+
+    def _sql_get_template(self, content_type, limit):
+        """Return (template, values) for get() from sql_cache, or None if not cacheable."""
+        model = getattr(web.ctx, 'ermrest_catalog_model', None)
+        roles = getattr(web.ctx, 'ermrest_client_roles', None)
+        catalog_key = getattr(web.ctx, 'ermrest_catalog_key', None)
+        if not sql_cache.enabled or model is None or roles is None or catalog_key is None:
+            return None
+        values = []
+        shape = self.sql_shape(values)
+        if shape is None:
+            return None
+        key = (catalog_key, model.version, frozenset(roles), content_type, limit, shape)
+        template = sql_cache.get(key)
+        if template is None:
+            template = SqlTemplate(values, lambda : self._sql_get_generate(content_type, limit))
+            sql_cache.put(key, template)
+        return template, values
+
+    def _sql_get_cached(self, content_type, limit):
+        """Return SQL for get() using sql_cache when possible."""
+        cached = self._sql_get_template(content_type, limit)
+        if cached is None:
+            return self._sql_get_generate(content_type, limit)
+        template, values = cached
+        return template.render(values)
+
     def _get_sort_element(self, key):
         raise NotImplementedError()
 
@@ -934,18 +1345,21 @@ class AnyPath (object):
             sortvec, sort1, sort2 = (None, None, None)
         return sortvec, sort1, sort2
 
-    def _get_page_sql(self, sortvec, output_type_overrides={}):
+    def _get_page_conditions(self, sortvec, talias=None):
+        conditions = []
         if sortvec is not None:
-            a, b, c = zip(*sortvec)
+            a, b, c, d = zip(*sortvec)
             if self.after is not None:
-                page = 'WHERE (%s)' % page_filter_sql(a, b, c, self.after, is_before=False)
-                if self.before is not None:
-                    page = '%s AND (%s)' % (page, page_filter_sql(a, b, c, self.before, is_before=True))
-            elif self.before is not None:
-                page = 'WHERE (%s)' % page_filter_sql(a, b, c, self.before, is_before=True)
-            else:
-                page = ''
-        return page
+                conditions.append(page_filter_sql(a, b, c, self.after, is_before=False, nullables=d, talias=talias))
+            if self.before is not None:
+                conditions.append(page_filter_sql(a, b, c, self.before, is_before=True, nullables=d, talias=talias))
+        return conditions
+
+    def _get_page_sql(self, sortvec, output_type_overrides={}):
+        conditions = self._get_page_conditions(sortvec)
+        if conditions:
+            return 'WHERE ' + ' AND '.join([ '(%s)' % c for c in conditions ])
+        return ''
 
     def _sql_get_agg_attributes(self, allow_extra=True):
         """Process attribute lists for aggregation APIs.
@@ -1032,10 +1446,23 @@ class AnyPath (object):
         elif hasattr(self, 'epath'):
             self.epath._path[0].table.enforce_right('select')
 
-        sql = self.sql_get(row_content_type=content_type, limit=limit, dynauthz=True)
+        cached = self._sql_get_template(content_type, limit)
+        if cached is not None:
+            template, values = cached
+            sql = template.render(values)
+        else:
+            sql = self._sql_get_generate(content_type, limit)
 
         #web.debug(sql)
 
+        heavy = cost_admission.admit(cur, sql)
+        try:
+            return self._get_results(conn, cur, sql, cached, content_type, output_file)
+        finally:
+            if heavy:
+                cost_admission.release()
+
+    def _get_results(self, conn, cur, sql, cached, content_type, output_file):
         if output_file:
             # efficiently send results to file
             if content_type == 'text/csv':
@@ -1055,17 +1482,25 @@ class AnyPath (object):
             # generate rows to caller
             if content_type == 'text/csv':
                 # TODO implement and use row_to_csv() stored procedure?
-                pass
+                wrapper = "%s"
             elif content_type == 'application/json':
-                sql = "SELECT array_to_json(COALESCE(array_agg(row_to_json(q.*)), ARRAY[]::json[]), True)::text FROM (%s) q" % sql
+                wrapper = "SELECT array_to_json(COALESCE(array_agg(row_to_json(q.*)), ARRAY[]::json[]), True)::text FROM (%s) q"
             elif content_type == 'application/x-json-stream':
-                sql = "SELECT row_to_json(q.*)::text FROM (%s) q" % sql
+                wrapper = "SELECT row_to_json(q.*)::text FROM (%s) q"
             elif content_type in [ dict, tuple ]:
-                pass
+                wrapper = "%s"
             else:
                 raise NotImplementedError('content_type %s' % content_type)
 
-            cur.execute(sql)
+            if cached is not None and getattr(conn, 'prepare_statements', False):
+                # reuse the session's plan for this template
+                template, values = cached
+                conn.execute_prepared(
+                    cur, wrapper % template.param_sql, template.param_types, template.param_literals(values),
+                    web.ctx.ermrest_catalog_model.version
+                )
+            else:
+                cur.execute(wrapper % sql)
             
             return make_row_thunk(None, cur, content_type)()
 
@@ -1213,11 +1648,55 @@ WHERE %(pred)s
                 raise BadData('Alias %s bound more than once.' % ralias)
             self.aliases[ralias] = rpos
 
+    def sql_shape(self, values):
+        return (
+            tuple([ elem.sql_shape(values) for elem in self._path ]),
+            self._context_index,
+        ) + self._sort_paging_shape(values)
+
+    def is_outer_joined(self):
+        """Return True if any element is outer joined, so NOT NULL columns may yield NULL."""
+        return [ elem for elem in self._path if elem.outer_type is not None ] != []
+
+    def is_functional(self):
+        """Return True if each context entity joins at most one row of every other path element.
+
+           Such a path cannot repeat context entities, so they need no
+           DISTINCT ON.  Each element must be reachable from the context
+           through inner joins on enforced keys, where the referencing
+           side determines the referenced side.
+        """
+        if self.is_outer_joined():
+            return False
+
+        determined = set([ self.current_entity_position() ])
+        progress = True
+        while progress:
+            progress = False
+            for elem in self._path[1:]:
+                if not elem.keyref.is_functional():
+                    continue
+                if elem.keyref_alias:
+                    lpos = self.aliases[elem.keyref_alias]
+                else:
+                    lpos = elem.context_pos
+                if elem.refop == '=@':
+                    # left row references at most one right row
+                    src, dst = lpos, elem.pos
+                else:
+                    # right row references at most one left row
+                    src, dst = elem.pos, lpos
+                if src in determined and dst not in determined:
+                    determined.add(dst)
+                    progress = True
+
+        return len(determined) == len(self._path)
+
     def _get_sort_element(self, key):
         table = self.current_entity_table()
         column = table.columns.get_enumerable(key.keyname)
         # select access was already enforced for enumerable output columns
-        return (key.keyname, key.descending, column.type)
+        return (key.keyname, key.descending, column.type, not column.attnotnull or self.is_outer_joined())
 
     def sql_get(self, selects=None, distinct_on=True, row_content_type='application/json', limit=None, dynauthz=None, access_type='select', prefix='', enforce_client=True, dynauthz_testcol=None):
         """Generate SQL query to get the entities described by this epath.
@@ -1288,9 +1767,15 @@ WHERE %(pred)s
         for elem in self._path:
             wheres.extend( elem.sql_wheres(prefix=prefix) )
 
-        if len(self._path) == 1:
+        if len(self._path) == 1 or self.is_functional():
             distinct_on = False
-            
+
+        sortvec, sort1, sort2 = self._get_sortvec()
+        limit = 'LIMIT %d' % limit if limit is not None else ''
+        if sort1 is not None and not distinct_on:
+            # page and sort the join directly since entities cannot repeat
+            wheres.extend( self._get_page_conditions(sortvec, talias='%st%d' % (prefix, context_pos)) )
+
         sql = """
 SELECT 
   %(distinct_on)s
@@ -1303,12 +1788,13 @@ FROM %(tables)s
            where       = wheres and ('WHERE ' + ' AND '.join(['(%s)' % w for w in wheres])) or ''
            )
 	
-	# This subquery is ugly and inefficient but necessary due to DISTINCT ON above
-        sortvec, sort1, sort2 = self._get_sortvec()
-        limit = 'LIMIT %d' % limit if limit is not None else ''
     	if sort1 is not None:
-            page = self._get_page_sql(sortvec)
-            sql = "SELECT * FROM (%s) s %s ORDER BY %s %s" % (sql, page, sort1, limit)
+            if distinct_on:
+                # This subquery is ugly and inefficient but necessary due to DISTINCT ON above
+                page = self._get_page_sql(sortvec)
+                sql = "SELECT * FROM (%s) s %s ORDER BY %s %s" % (sql, page, sort1, limit)
+            else:
+                sql = "%s ORDER BY %s %s" % (sql, sort1, limit)
             if sort2 is not None:
                 if not limit:
                     raise BadSyntax('Page @before(...) modifier not allowed without limit parameter.')
@@ -1445,10 +1931,16 @@ class AttributePath (AnyPath):
         self.after = after
         self.before = before
 
+    def sql_shape(self, values):
+        return (
+            self.epath.sql_shape(values),
+            tuple([ attribute_shape(self.epath, *a) for a in self.attributes ]),
+        ) + self._sort_paging_shape(values)
+
     def _get_sort_element(self, key):
         if key.keyname not in self.outputs:
             raise BadData('Sort key "%s" not among output columns.' % key.keyname)
-        return (key.keyname, key.descending, self.output_types[key.keyname])
+        return (key.keyname, key.descending, self.output_types[key.keyname], self.output_nullables[key.keyname])
 
     def sql_get(self, split_sort=False, distinct_on=True, row_content_type='application/json', limit=None, dynauthz=None, access_type='select', prefix='', enforce_client=True):
         """Generate SQL query to get the resources described by this apath.
@@ -1471,6 +1963,7 @@ class AttributePath (AnyPath):
 
         outputs = set()
         output_types = {}
+        output_nullables = {}
 
         for attribute, col, base in self.attributes:
             if base == self.epath:
@@ -1482,6 +1975,9 @@ class AttributePath (AnyPath):
             else:
                 raise ConflictModel('Invalid attribute name "%s".' % attribute)
 
+            # only plain columns with enforced NOT NULL are known to be NOT NULL
+            nullable = True
+
             if hasattr(attribute, 'nbins'):
                 typname = col.type.sql(basic_storage=True)
 
@@ -1533,6 +2029,7 @@ END
                 select = "True"
             else:
                 select = "%s.%s" % (alias, col.sql_name())
+                nullable = not col.attnotnull or self.epath.is_outer_joined()
 
             select = select
 
@@ -1544,17 +2041,20 @@ END
                     raise BadSyntax('Output column name "%s" appears more than once.' % attribute.alias)
                 outputs.add(unicode(attribute.alias))
                 output_types[unicode(attribute.alias)] = col.type
+                output_nullables[unicode(attribute.alias)] = nullable
                 selects.append('%s AS %s' % (select, sql_identifier(attribute.alias)))
             else:
                 if unicode(col.name) in outputs:
                     raise BadSyntax('Output column name "%s" appears more than once.' % col.name)
                 outputs.add(unicode(col.name))
                 output_types[unicode(col.name)] = col.type
+                output_nullables[unicode(col.name)] = nullable
                 selects.append('%s AS %s' % (select, col.sql_name()))
 
         # HACK: _get_sortvec() calls _get_sort_element() which looks at self.outputs and self.output_types
         self.outputs = outputs
         self.output_types = output_types
+        self.output_nullables = output_nullables
         sortvec, sort1, sort2 = self._get_sortvec()
         page = ''
         if sort1 is not None:
@@ -1690,14 +2190,23 @@ class AttributeGroupPath (AnyPath):
         self.after = after
         self.before = before
             
+    def sql_shape(self, values):
+        return (
+            self.epath.sql_shape(values),
+            tuple([ attribute_shape(self.epath, *a) for a in self.groupkeys ]),
+            tuple([ attribute_shape(self.epath, *a) for a in self.attributes ]),
+        ) + self._sort_paging_shape(values)
+
     def _get_sort_element(self, key):
         if key.keyname in self.output_type_overrides:
             otype = self.output_type_overrides[key.keyname]
+            nullable = True
         elif key.keyname in self.apath.outputs:
             otype = self.apath.output_types[key.keyname]
+            nullable = self.apath.output_nullables[key.keyname]
         else:
             raise BadData('Sort key "%s" not among output columns.' % key.keyname)
-        return (key.keyname, key.descending, otype)
+        return (key.keyname, key.descending, otype, nullable)
 
     def sql_get(self, row_content_type='application/json', limit=None, dynauthz=None, access_type='select', prefix='', enforce_client=True):
         """Generate SQL query to get the resources described by this apath.
@@ -1904,6 +2413,12 @@ class AggregatePath (AnyPath):
     def add_paging(self, before, after):
         # to honour generic API.  actually gated on self.add_sort() above so no need to test again
         pass
+
+    def sql_shape(self, values):
+        return (
+            self.epath.sql_shape(values),
+            tuple([ attribute_shape(self.epath, *a) for a in self.attributes ]),
+        )
         
     def sql_get(self, row_content_type='application/json', limit=None, dynauthz=None, prefix='', enforce_client=True):
         """Generate SQL query to get the resources described by this apath.
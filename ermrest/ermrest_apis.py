@@ -66,17 +66,21 @@ import struct
 import urllib
 import sys
 import traceback
+import json
 import psycopg2
 import webauthn2
 
-from .apicore import global_env, webauthn2_manager, web_method, registry, catalog_factory
-from .url import url_parse_func, ast
+from .apicore import global_env, webauthn2_manager, web_method, registry, catalog_factory, model_warmer
+from .url import url_parse_func, url_parse_cache, ast
 from .exception import *
 
 from .registry import get_registry
 from .catalog import get_catalog_factory
 from .util import urlquote
 
+# setup cache of parsed URLs
+url_parse_cache.configure(global_env.get('url_parse_cache'))
+
 # expose webauthn REST APIs
 webauthn2_handler_factory = webauthn2.RestHandlerFactory(manager=webauthn2_manager)
 UserSession = webauthn2_handler_factory.UserSession
@@ -172,6 +176,22 @@ class Dispatcher (object):
     def POST(self):
         return self.METHOD('POST')
 
+class Readiness (object):
+    """Report whether this service process has finished warming up.
+
+       Health checks can poll this resource, which responds 503
+       while the model cache warm-up is still running.
+    """
+    @web_method()
+    def GET(self):
+        content_type = 'application/json'
+        web.header('Content-Type', content_type)
+        web.ctx.ermrest_request_content_type = content_type
+        status = model_warmer.status()
+        if not status['ready']:
+            web.ctx.status = '503 Service Unavailable'
+        return json.dumps(status) + '\n'
+
 def web_urls():
     """Builds and returns the web_urls for web.py.
     """
@@ -196,6 +216,9 @@ def web_urls():
 
         # the catalog factory
         '/catalog/?', ast.Catalogs,
+
+        # service readiness for health checks
+        '/ready/?', Readiness,
         
         # core parser-based REST dispatcher
         '(?s).*', Dispatcher
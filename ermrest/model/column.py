@@ -55,6 +55,8 @@ class Column (object):
     It also has a reference to its 'table'.
     """
     
+    __slots__ = ('table', 'name', 'position', 'type', 'default_value', 'nullok', 'attnotnull', 'comment', 'annotations', 'acls', 'dynacls')
+
     def __init__(self, name, position, type, default_value, nullok=None, comment=None, annotations={}, acls={}, dynacls={}):
         self.table = None
         self.name = name
@@ -62,6 +64,8 @@ class Column (object):
         self.type = type
         self.default_value = default_value
         self.nullok = nullok if nullok is not None else True
+        # pseudo not-null constraints clear nullok but are not enforced by Postgres
+        self.attnotnull = not self.nullok
         self.comment = comment
         self.annotations = AltDict(lambda k: exception.NotFound(u'annotation "%s" on column %s' % (k, self)))
         self.annotations.update(annotations)
@@ -297,6 +301,8 @@ class FreetextColumn (Column):
        as a document, sorted by column order.
     """
     
+    __slots__ = ('srccols',)
+
     def __init__(self, table):
         Column.__init__(self, '*', None, tsvector_type, None)
 
@@ -24,23 +24,48 @@ information_schema of a relational database. It represents the model as
 needed by other modules of the ermrest project.
 """
 
+import re
 import web
 
 from .. import exception
 from ..util import table_exists, view_exists, column_exists
 from .misc import frozendict, annotatable_classes, hasacls_classes, hasdynacls_classes
 from .schema import Model, Schema
-from .type import build_type, text_type
+from .type import build_type, text_type, _pg_serial_default_pattern
 from .column import Column
 from .table import Table
 from .key import Unique, ForeignKey, KeyReference, PseudoUnique, PseudoKeyReference
 
-def current_model_version(cur):
-    cur.execute("""
+def current_model_version(cur, prologue=''):
+    """Return the model version visible to cur's transaction.
+
+       Any prologue SQL statements are sent in the same round trip
+       ahead of the version query.
+    """
+    cur.execute(prologue + """
 SELECT max(snap_txid) AS txid FROM _ermrest.model_version WHERE snap_txid < txid_snapshot_xmin(txid_current_snapshot()) ;
 """)
     return cur.next()[0]
 
+def _overlay_helpers():
+    """Return list of (klass, helper name) for model overlay introspection, in order."""
+    return [
+        (klass, 'introspect_helper') for klass in annotatable_classes if hasattr(klass, 'introspect_helper')
+    ] + [
+        (klass, 'introspect_acl_helper') for klass in hasacls_classes if hasattr(klass, 'introspect_acl_helper')
+    ] + [
+        (klass, 'introspect_dynacl_helper') for klass in hasdynacls_classes if hasattr(klass, 'introspect_dynacl_helper')
+    ]
+
+def _type_key(doc):
+    """Return a hashable key for a column type document or any value in it."""
+    if isinstance(doc, dict):
+        # tag dicts so they never equal a list of pairs
+        return (dict, tuple(sorted([ (k, _type_key(v)) for k, v in doc.items() ])))
+    elif isinstance(doc, (list, tuple)):
+        return (list, tuple([ _type_key(v) for v in doc ]))
+    return doc
+
 def introspect(cur, config=None):
     """Introspects a Catalog (i.e., a database).
     
@@ -269,6 +294,10 @@ FROM _ermrest.model_pseudo_keyref ;
     fkeys    = dict()
     fkeyrefs = dict()
 
+    # share equal column names and types among the many columns of large models
+    cnames_shared = dict()
+    types_shared = dict()
+
     cur.execute("""
 SELECT max(snap_txid) AS txid FROM _ermrest.model_version WHERE snap_txid < txid_snapshot_xmin(txid_current_snapshot()) ;
 """
@@ -289,7 +318,15 @@ SELECT max(snap_txid) AS txid FROM _ermrest.model_version WHERE snap_txid < txid
         web.debug('NOTICE: adding _ermrest.model_psuedo_key.name column during model introspection')
         cur.execute('ALTER TABLE _ermrest.model_pseudo_key ADD COLUMN "name" text UNIQUE;')
 
-    cur.execute(HEAL_DATA_VERSIONS);
+    cur.execute("SELECT pg_is_in_recovery();")
+    if not cur.next()[0]:
+        # a hot-standby replica is read-only and relies on its primary for healing
+        cur.execute(HEAL_DATA_VERSIONS);
+
+        # upgrade catalogs in the field to track overlay-only model changes
+        if not table_exists(cur, "_ermrest", "model_overlay_change"):
+            web.debug('NOTICE: adding _ermrest.model_overlay_change table during model introspection')
+            cur.execute('CREATE TABLE _ermrest.model_overlay_change (snap_txid bigint PRIMARY KEY);')
     
     #
     # Introspect schemas, tables, columns
@@ -308,7 +345,15 @@ SELECT max(snap_txid) AS txid FROM _ermrest.model_version WHERE snap_txid < txid
         cols = []
         for i in range(0, len(cnames)):
             # Determine base type
-            base_type = build_type(column_types[i], defaultval=default_values[i], config=config, readonly=True)
+            # only a serial-style default changes the introspected type
+            type_key = (
+                _type_key(column_types[i]),
+                default_values[i] is not None and re.match(_pg_serial_default_pattern, default_values[i]) is not None
+            )
+            base_type = types_shared.get(type_key)
+            if base_type is None:
+                base_type = build_type(column_types[i], defaultval=default_values[i], config=config, readonly=True)
+                types_shared[type_key] = base_type
                 
             # Translate default_value
             try:
@@ -317,7 +362,8 @@ SELECT max(snap_txid) AS txid FROM _ermrest.model_version WHERE snap_txid < txid
                 # TODO: raise informative exception instead of masking error
                 default_value = None
 
-            col = Column(cnames[i].decode('utf8'), i, base_type, default_value, not notnull[i], comments[i])
+            cname = cnames_shared.setdefault(cnames[i], cnames[i].decode('utf8'))
+            col = Column(cname, i, base_type, default_value, not notnull[i], comments[i])
             cols.append( col )
             columns[(dname, sname, tname, cnames[i])] = col
         
@@ -332,6 +378,7 @@ SELECT max(snap_txid) AS txid FROM _ermrest.model_version WHERE snap_txid < txid
     for nn_id, dname, sname, tname, cname in cur:
         # skip if column is not found due to orphaned psuedo not-null entry...
         if (dname, sname, tname, cname) in columns:
+            # attnotnull keeps what Postgres enforces, e.g. nothing for views
             columns[(dname, sname, tname, cname)].nullok = False
 
     # also get empty tables
@@ -438,21 +485,10 @@ SELECT max(snap_txid) AS txid FROM _ermrest.model_version WHERE snap_txid < txid
         )
     
     #
-    # Introspect ERMrest model overlay annotations
+    # Introspect ERMrest model overlay annotations, ACLs, and ACL bindings
     #
-    for klass in annotatable_classes:
-        if hasattr(klass, 'introspect_helper'):
-            klass.introspect_helper(cur, model)
-
-    # introspect ERMrest model ACLs
-    for klass in hasacls_classes:
-        if hasattr(klass, 'introspect_acl_helper'):
-            klass.introspect_acl_helper(cur, model)
-
-    # introspect ERMrest model ACLs
-    for klass in hasdynacls_classes:
-        if hasattr(klass, 'introspect_dynacl_helper'):
-            klass.introspect_dynacl_helper(cur, model)
+    for klass, helper in _overlay_helpers():
+        getattr(klass, helper)(cur, model)
 
     # save our private schema in case we want to unhide it later...
     model.ermrest_schema = model.schemas['_ermrest']
@@ -34,6 +34,8 @@ import json
 class Unique (object):
     """A unique constraint."""
     
+    __slots__ = ('table', 'columns', 'table_references', 'constraint_name', 'constraints', 'comment', 'annotations')
+
     def __init__(self, cols, constraint_name=None, comment=None, annotations={}):
         tables = set([ c.table for c in cols ])
         assert len(tables) == 1
@@ -212,6 +214,8 @@ SELECT _ermrest.model_change_event();
 class PseudoUnique (object):
     """A pseudo-uniqueness constraint."""
 
+    __slots__ = ('table', 'columns', 'table_references', 'id', 'constraint_name', 'constraints', 'comment', 'annotations')
+
     def __init__(self, cols, id=None, constraint_name=None, comment=None, annotations={}):
         tables = set([ c.table for c in cols ])
         assert len(tables) == 1
@@ -336,6 +340,8 @@ SELECT _ermrest.model_change_event();
 class ForeignKey (object):
     """A foreign key."""
 
+    __slots__ = ('table', 'columns', 'references', 'table_references')
+
     def __init__(self, cols):
         tables = set([ c.table for c in cols ])
         assert len(tables) == 1
@@ -484,6 +490,8 @@ def _keyref_has_right(self, aclname, roles=None):
 class KeyReference (object):
     """A reference from a foreign key to a primary key."""
     
+    __slots__ = ('foreign_key', 'unique', 'reference_map_frozen', 'reference_map', 'referenceby_map', 'on_delete', 'on_update', 'constraint_name', 'constraints', 'annotations', 'acls', 'dynacls', 'comment')
+
     def __init__(self, foreign_key, unique, fk_ref_map, on_delete='NO ACTION', on_update='NO ACTION', constraint_name=None, annotations={}, comment=None, acls={}, dynacls={}):
         self.foreign_key = foreign_key
         self.unique = unique
@@ -544,6 +552,11 @@ SELECT _ermrest.model_change_event();
 
     def join_sql(self, refop, lname, rname):
         return _keyref_join_sql(self, refop, lname, rname)
+
+    def is_functional(self):
+        """Return True if a referencing row joins at most one referenced row."""
+        # only keys enforced by Postgres guarantee it
+        return isinstance(self.unique, Unique)
     
     def __str__(self):
         return self.join_str('=@', str(self.foreign_key.table), str(self.unique.table))
@@ -729,6 +742,8 @@ SELECT _ermrest.model_change_event();
 class PseudoKeyReference (object):
     """A psuedo-reference from a foreign key to a primary key."""
     
+    __slots__ = ('foreign_key', 'unique', 'reference_map_frozen', 'reference_map', 'referenceby_map', 'id', 'constraint_name', 'constraints', 'annotations', 'acls', 'dynacls', 'comment')
+
     def __init__(self, foreign_key, unique, fk_ref_map, id=None, constraint_name=("", None), annotations={}, comment=None, acls={}, dynacls={}):
         self.foreign_key = foreign_key
         self.unique = unique
@@ -775,6 +790,10 @@ SELECT _ermrest.model_change_event();
                 
     def join_sql(self, refop, lname, rname):
         return _keyref_join_sql(self, refop, lname, rname)
+
+    def is_functional(self):
+        """Return True if a referencing row joins at most one referenced row."""
+        return isinstance(self.unique, Unique)
     
     def __str__(self):
         return self.join_str('=@', str(self.foreign_key.table), str(self.unique.table))
@@ -25,6 +25,8 @@ import json
 import web
 import hashlib
 import base64
+import threading
+from collections import OrderedDict
 
 def frozendict (d):
     """Convert a dictionary to a canonical and immutable form."""
@@ -80,8 +82,14 @@ sufficient_rights = {
     "enumerate": {"owner", "create", "write", "insert", "update", "delete", "select"},
 }
 
+# shared by the many model resources without ACLs; digests are replaced, never modified
+_empty_digest = dict()
+_empty_set = frozenset()
+
 class AltDict (dict):
     """Alternative dict that raises custom errors."""
+    __slots__ = ('_keyerror', '_validator')
+
     def __init__(self, keyerror, validator=lambda k, v: (k, v)):
         dict.__init__(self)
         self._keyerror = keyerror
@@ -108,6 +116,8 @@ class AltDict (dict):
 
 class AclDict (dict):
     """Alternative dict that validates keys and returns default."""
+    __slots__ = ('_subject', '_acls')
+
     def __init__(self, subject):
         dict.__init__(self)
         self._subject = subject
@@ -116,19 +126,21 @@ class AclDict (dict):
 
     def _digest(self):
         web.ctx.ermrest_model_rights_cache.clear()
-        self._acls = dict()
+        acls = dict()
         for aclname, members in self.items():
             if members is None:
                 continue
             members = set(members)
-            if aclname not in self._acls:
-                self._acls[aclname] = set()
-            self._acls[aclname].update(members)
+            if aclname not in acls:
+                acls[aclname] = set()
+            acls[aclname].update(members)
             for aclname2, sufficient in sufficient_rights.items():
                 if aclname in sufficient:
-                    if aclname2 not in self._acls:
-                        self._acls[aclname2] = set()
-                    self._acls[aclname2].update(members)
+                    if aclname2 not in acls:
+                        acls[aclname2] = set()
+                    acls[aclname2].update(members)
+        # most resources have no ACLs, so share one empty digest
+        self._acls = acls if acls else _empty_digest
 
     def __getitem__(self, k):
         if k not in self._subject._acls_supported:
@@ -161,6 +173,8 @@ class AclDict (dict):
 
 class DynaclDict (dict):
     """Alternative dict specialized for dynamic acl bindings."""
+    __slots__ = ('_subject', '_binding_types')
+
     def __init__(self, subject):
         dict.__init__(self)
         self._subject = subject
@@ -169,10 +183,11 @@ class DynaclDict (dict):
 
     def _digest(self):
         web.ctx.ermrest_model_rights_cache.clear()
-        self._binding_types = set()
+        binding_types = set()
         for binding in self.values():
             if binding:
-                self._binding_types.update(set(binding['types']))
+                binding_types.update(set(binding['types']))
+        self._binding_types = frozenset(binding_types) if binding_types else _empty_set
 
     def __getitem__(self, k):
         try:
@@ -191,8 +206,12 @@ class DynaclDict (dict):
         dict.__delitem__(self, k)
         self._digest()
 
+_client_attributes_placeholder = '_ermrest_client_attributes_'
+
 class AclBinding (AltDict):
     """Represents one acl binding."""
+    __slots__ = ('model', 'resource', 'binding_name', '_sql_parts')
+
     def __init__(self, model, resource, binding_name, doc):
         def keyerror(k):
             return KeyError(k)
@@ -223,6 +242,7 @@ class AclBinding (AltDict):
         self.model = model
         self.resource = resource
         self.binding_name = binding_name
+        self._sql_parts = dict()
 
         # let AltDict validator behavior check each field above for simple stuff...
         for k, v in doc.items():
@@ -253,6 +273,30 @@ class AclBinding (AltDict):
             return False
         return True
 
+    def sql_clause(self, prefix):
+        """Return SQL test of this binding for the client against the row aliased by prefix.
+
+           The SQL is compiled once per prefix with a placeholder
+           for the client attributes, which are substituted for each
+           use.
+        """
+        parts = self._sql_parts.get(prefix)
+        if parts is None:
+            parts = self._compile_sql(prefix, _client_attributes_placeholder).split(_client_attributes_placeholder)
+            if len(parts) > 2:
+                # placeholder also appears in binding content, so do not reuse
+                return self._compile_sql(prefix)
+            self._sql_parts[prefix] = parts
+        if len(parts) == 1:
+            return parts[0]
+        return predicate.client_attributes_sql().join(parts)
+
+    def _compile_sql(self, prefix, attrs_sql=None):
+        aclpath, col, ctype = self._compile_projection()
+        aclpath.epath.add_filter(predicate.AclPredicate(self, col, attrs_sql))
+        authzpath = ermpath.AttributePath(aclpath.epath, [ (True, None, aclpath.epath) ])
+        return authzpath.sql_get(limit=1, distinct_on=False, prefix=prefix, enforce_client=False)
+
     def _compile_projection(self):
         proj = self['projection']
 
@@ -473,6 +517,98 @@ SELECT %(cols)s FROM _ermrest.%(tname)s;
             # TODO: prune orphaned auxilliary storage?
             pass
 
+class RightsCache (object):
+    """A bounded, thread-safe LRU cache of access decisions shared by requests.
+
+       Each entry is a decision table for one catalog model version
+       and one client role set, keyed by (catalog key, model version,
+       roles), which requests use as their
+       web.ctx.ermrest_model_rights_cache.  Only models from the
+       model cache, which are never mutated, may share tables.
+       Storing a table for a newer version drops the tables of older
+       versions of the same catalog, so superseded models are not
+       kept alive by their decisions.  Least recently used tables are
+       evicted when max_entries is exceeded.
+
+    """
+    def __init__(self, config=None):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # key -> decision table
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.configure(config)
+
+    def configure(self, config=None):
+        """Apply rights_cache config settings."""
+        if config is None:
+            config = dict()
+        self.enabled = config.get('enabled', True)
+        self.max_entries = config.get('max_entries', 256)
+        self._lock.acquire()
+        try:
+            self._evict()
+        finally:
+            self._lock.release()
+
+    def decisions(self, catalog_key, model, roles):
+        """Return decision table shared by requests with roles on model of catalog."""
+        if not self.enabled:
+            return dict()
+        key = (catalog_key, model.version, frozenset(roles))
+        self._lock.acquire()
+        try:
+            table = self._entries.pop(key, None)
+            if table is None:
+                self.misses += 1
+                table = dict()
+                self._purge(catalog_key, model.version)
+            else:
+                self.hits += 1
+            # (re-)insert as most recently used
+            self._entries[key] = table
+            self._evict()
+            return table
+        finally:
+            self._lock.release()
+
+    def _purge(self, catalog_key, version):
+        """Drop tables for versions of catalog older than version.  Caller must hold self._lock."""
+        for key in list(self._entries.keys()):
+            if key[0] == catalog_key and key[1] < version:
+                del self._entries[key]
+
+    def _evict(self):
+        """Evict least recently used entries to fit budget.  Caller must hold self._lock."""
+        if self.max_entries is None:
+            return
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._entries.clear()
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        """Return a dictionary of cache statistics."""
+        self._lock.acquire()
+        try:
+            return dict(
+                entries=len(self._entries),
+                decisions=sum([ len(table) for table in self._entries.values() ]),
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+            )
+        finally:
+            self._lock.release()
+
+rights_cache = RightsCache()
+
 def cache_rights(orig_method):
     def helper(self, aclname, roles=None, anon_mutation_ok=False):
         key = (self, orig_method, aclname, frozenset(roles) if roles is not None else None, anon_mutation_ok)
@@ -930,10 +1066,7 @@ def get_dynacl_clauses(src, access_type, prefix, dynacls=None):
             if not binding.inscope(access_type):
                 continue
 
-            aclpath, col, ctype = binding._compile_projection()
-            aclpath.epath.add_filter(predicate.AclPredicate(binding, col))
-            authzpath = ermpath.AttributePath(aclpath.epath, [ (True, None, aclpath.epath) ])
-            clauses.append(authzpath.sql_get(limit=1, distinct_on=False, prefix=prefix, enforce_client=False))
+            clauses.append(binding.sql_clause(prefix))
     else:
         clauses = ['True']
 
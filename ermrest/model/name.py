@@ -108,6 +108,10 @@ class MultiKeyReference (object):
         assert aclname == 'enumerate'
         return self._visible_links() is not []
 
+    def is_functional(self):
+        """Return False since a row may match several links."""
+        return False
+
 class ExplicitJoinReference (object):
 
     def __init__(self, lcols, rcols):
@@ -143,6 +147,10 @@ class ExplicitJoinReference (object):
                 return False
         return True
 
+    def is_functional(self):
+        """Return False since the right columns need not form a key."""
+        return False
+
 def _exact_link_cols(lcols, rcols):
     if len(lcols) != len(rcols):
         raise exception.BadSyntax('Left and right name lists in (left)=(right) link notation must be equal length.')
@@ -396,6 +404,10 @@ class Name (object):
             return Value(self.nameparts[0]).sql_literal(etype)
         else:
             raise exception.BadSyntax('Names such as "%s" not supported in filter expressions.' % self)
+
+    def sql_shape(self, values):
+        """Return SQL shape of this name used as a literal value."""
+        return ('name', tuple(self.nameparts))
         
     def validate_attribute_update(self):
         """Return icolname for valid input column reference.
@@ -29,6 +29,9 @@ class Value (object):
     """Represent a literal value in an ERMREST URL.
 
     """
+    # slot callback set while ermpath.SqlCache generates a template
+    sql_slot = None
+
     def __init__(self, s):
         self._str = s
 
@@ -46,7 +49,16 @@ class Value (object):
         return self._str is None
 
     def sql_literal(self, etype):
-        return etype.sql_literal(etype.url_parse(self._str))
+        literal = etype.sql_literal(etype.url_parse(self._str))
+        if self.sql_slot is not None:
+            # literal is still rendered above to validate it
+            return self.sql_slot(etype)
+        return literal
+
+    def sql_shape(self, values):
+        """Return SQL shape of this literal, appending self to values."""
+        values.append(self)
+        return ('value', self.is_null())
 
     def validate_attribute_update(self):
         raise BadSyntax('Value %s is not supported in an attribute update path filter.' % self)
@@ -81,11 +93,23 @@ class AclBasePredicate (object):
         ]
         return ' AND '.join(['(%s)' % clause for clause in clauses ])
 
+    def sql_shape(self, values):
+        return (self.__class__,)
+
+def client_attributes_sql():
+    """Return SQL text[] expression of the client's attributes including the wildcard."""
+    return 'ARRAY[%s]::text[]' % ','.join([ sql_literal(a['id']) for a in web.ctx.webauthn2_context.attributes ] + [sql_literal('*')])
+
 class AclPredicate (object):
-    def __init__(self, binding, column):
+    def __init__(self, binding, column, attrs_sql=None):
+        """Represent an ACL binding projection test.
+
+           attrs_sql: SQL to use in place of client_attributes_sql()
+        """
         self.binding = binding
         self.left_col = column
         self.left_elem = None
+        self.attrs_sql = attrs_sql
 
     def validate(self, epath, allow_star=False, enforce_client=True):
         self.left_elem = epath._path[epath.current_entity_position()]
@@ -93,7 +117,7 @@ class AclPredicate (object):
     def sql_where(self, epath, elem, prefix=''):
         lname = '%st%d.%s' % (prefix, self.left_elem.pos, self.left_col.sql_name())
         if self.binding['projection_type'] == 'acl':
-            attrs = 'ARRAY[%s]::text[]' % ','.join([ sql_literal(a['id']) for a in web.ctx.webauthn2_context.attributes ] + [sql_literal('*')])
+            attrs = self.attrs_sql if self.attrs_sql is not None else client_attributes_sql()
             if self.left_col.type.is_array:
                 return '%s && %s' % (lname, attrs)
             else:
@@ -101,6 +125,9 @@ class AclPredicate (object):
         else:
             return '%s IS NOT NULL' % (lname,)
 
+    def sql_shape(self, values):
+        return (self.__class__, self.left_elem.pos, unicode(self.left_col.name), self.binding['projection_type'], self.attrs_sql)
+
 class Predicate (object):
 
     def __init__(self, left_name, op):
@@ -125,6 +152,13 @@ class Predicate (object):
     def validate_attribute_update(self, apath):
         raise BadSyntax('Predicate %s is not supported in an attribute update path filter.' % self)
 
+    def sql_shape(self, values):
+        """Return hashable shape of sql_where() text, appending literal Values to values.
+
+           Predicates with equal shapes only differ in their literals.
+        """
+        return (self.__class__, self.left_elem.pos, unicode(self.left_col.name))
+
 class UnaryPredicate (Predicate):
     def __init__(self, left_name, right_expr=None):
         Predicate.__init__(self, left_name, self.restop)
@@ -160,6 +194,9 @@ class BinaryPredicate (Predicate):
         if self.right_expr is None:
             raise TypeError('Operator %s requires right-hand value' % self.op)
 
+    def sql_shape(self, values):
+        return Predicate.sql_shape(self, values) + (self.right_expr.sql_shape(values),)
+
     def sql_where(self, epath, elem, prefix=''):
         if self.left_col.type.is_array:
             return '(SELECT bool_or(v %s %s) FROM unnest(%st%d.%s) x (v))' % (
@@ -308,6 +345,9 @@ class Negation (object):
     def sql_where(self, epath, elem, prefix=''):
         return 'NOT (%s)' % self.predicate.sql_where(epath, elem, prefix=prefix)
 
+    def sql_shape(self, values):
+        return ('not', self.predicate.sql_shape(values))
+
 
 class Disjunction (list):
     def validate(self, epath, enforce_client=True):
@@ -317,6 +357,9 @@ class Disjunction (list):
         preds_sql = [ "(%s)" % f.sql_where(epath, elem, prefix=prefix) for f in self ]
         return " OR ".join(preds_sql)
 
+    def sql_shape(self, values):
+        return ('or',) + tuple([ f.sql_shape(values) for f in self ])
+
 class Conjunction (list):
     def validate(self, epath, enforce_client=True):
         return [ f.validate(epath, enforce_client=enforce_client) for f in self ]
@@ -325,4 +368,7 @@ class Conjunction (list):
         preds_sql = [ "(%s)" % f.sql_where(epath, elem, prefix=prefix) for f in self ]
         return " AND ".join(preds_sql)
 
+    def sql_shape(self, values):
+        return ('and',) + tuple([ f.sql_shape(values) for f in self ])
+
 
@@ -36,6 +36,8 @@ class Model (object):
     database sense of the term.
     """
     
+    __slots__ = ('version', 'schemas', 'acls', 'annotations', 'ermrest_schema', '_acl_roles')
+
     def __init__(self, version):
         self.version = version
         self.schemas = AltDict(
@@ -44,11 +46,48 @@ class Model (object):
         )
         self.acls = AclDict(self)
         self.annotations = AltDict(lambda k: exception.NotFound(u'annotation "%s"' % (k,)))
+        self._acl_roles = None
 
     @staticmethod
     def keyed_resource(model=None):
         return model
 
+    def acl_roles(self):
+        """Return the set of roles named by any ACL or dynamic ACL binding scope in the model.
+
+           Computed once, so only call this on a model which is no
+           longer mutated.
+        """
+        if self._acl_roles is None:
+            roles = set()
+            def add(resource):
+                for members in resource.acls.values():
+                    if members:
+                        roles.update(members)
+                for binding in getattr(resource, 'dynacls', {}).values():
+                    if binding:
+                        roles.update(binding.get('scope_acl', []))
+            add(self)
+            for schema in self.schemas.values():
+                add(schema)
+                for table in schema.tables.values():
+                    add(table)
+                    for column in table.columns.values():
+                        add(column)
+                    for fkey in table.fkeys.values():
+                        for fkeyrefs in fkey.table_references.values():
+                            for fkeyref in fkeyrefs:
+                                add(fkeyref)
+            self._acl_roles = frozenset(roles)
+        return self._acl_roles
+
+    def visibility_key(self, roles=None):
+        """Return a key equal for all client roles receiving identical access decisions."""
+        if roles is None:
+            roles = web.ctx.ermrest_client_roles
+        # has_right() treats the purely anonymous client specially
+        return (frozenset(self.acl_roles().intersection(roles)), roles == {'*'})
+
     def verbose(self):
         return json.dumps(self.prejson(), indent=2)
 
@@ -135,6 +174,8 @@ class Schema (object):
     also has a reference to its 'model'.
     """
     
+    __slots__ = ('model', 'name', 'comment', 'tables', 'annotations', 'acls')
+
     def __init__(self, model, name, comment=None, annotations={}, acls={}):
         self.model = model
         self.name = name
@@ -0,0 +1,212 @@
+# 
+# Copyright 2013-2017 University of Southern California
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#    http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Recorded snapshots of model introspection.
+
+Introspecting a large catalog runs many queries.  A snapshot records
+the statements and result rows seen by introspect() for one catalog
+model version, so that the same Model can be rebuilt by replaying them
+instead of querying Postgres.  Snapshots are kept in memory alongside
+cached models and may be shared with other processes on disk.
+
+A replay may run selected statements live instead, e.g. to pick up
+changed annotations and ACLs on top of an unchanged catalog structure.
+
+Replay skips the statements introspection issues for their side
+effects, e.g. healing of data versions, since the recording process
+already ran them.  Snapshot files are loaded with cPickle, so the
+snapshot directory must only be writable by the service account.
+
+"""
+
+import os
+import re
+import copy
+import hashlib
+import tempfile
+import cPickle
+import web
+
+from .introspect import introspect
+
+__all__ = ["introspect_recorded", "introspect_replayed", "introspect_shared", "is_overlay_statement"]
+
+# bump whenever the snapshot file content changes incompatibly
+SNAPSHOT_FORMAT = 2
+
+class SnapshotMismatch (ValueError):
+    """Replayed introspection diverged from the recorded statements."""
+    pass
+
+class _BufferedCursor (object):
+    """Minimal cursor interface used by introspect() over buffered rows."""
+    def __init__(self):
+        self._rows = iter([])
+        self.rowcount = -1
+
+    def _set_result(self, rows, rowcount):
+        self._rows = iter(rows)
+        self.rowcount = rowcount
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        return self._rows.next()
+
+    def fetchone(self):
+        try:
+            return self._rows.next()
+        except StopIteration:
+            return None
+
+    def fetchall(self):
+        return list(self._rows)
+
+class RecordingCursor (_BufferedCursor):
+    """Cursor proxy which records each statement and its results."""
+    def __init__(self, cur):
+        _BufferedCursor.__init__(self)
+        self._cur = cur
+        self.log = []
+
+    def execute(self, sql, vars=None):
+        self._cur.execute(sql, vars)
+        rows = self._cur.fetchall() if self._cur.description is not None else []
+        self.log.append((sql, vars, rows, self._cur.rowcount))
+        self._set_result(rows, self._cur.rowcount)
+
+class ReplayCursor (RecordingCursor):
+    """Cursor stand-in which replays a RecordingCursor log.
+
+       Statements for which live(sql) is true are run on cur
+       instead.  The resulting mix is recorded as a new log.
+    """
+    def __init__(self, log, cur=None, live=lambda sql: False):
+        RecordingCursor.__init__(self, cur)
+        self._replay = iter(log)
+        self._live = live
+
+    def execute(self, sql, vars=None):
+        try:
+            rsql, rvars, rows, rowcount = self._replay.next()
+        except StopIteration:
+            raise SnapshotMismatch('unexpected statement after end of snapshot')
+        if (rsql, rvars) != (sql, vars):
+            raise SnapshotMismatch('statement differs from snapshot')
+        if self._cur is not None and self._live(sql):
+            RecordingCursor.execute(self, sql, vars)
+        else:
+            self.log.append((sql, vars, rows, rowcount))
+            # copy so the model cannot alias mutable values in the log
+            self._set_result(copy.deepcopy(rows), rowcount)
+
+_overlay_statement = re.compile(r'FROM _ermrest[.](model_version\b|model_\w+_(annotation|acl|dynacl);)')
+
+def is_overlay_statement(sql):
+    """Return True if sql reads the model version or annotation/ACL overlays."""
+    return _overlay_statement.search(sql) is not None
+
+def snapshot_path(directory, catalog_key, version):
+    """Return snapshot file path for catalog_key and model version."""
+    return os.path.join(
+        directory,
+        'model-%s-%s.pickle' % (hashlib.sha1(catalog_key).hexdigest(), version)
+    )
+
+_snapshot_version = re.compile(r'^model-([0-9a-f]+)-([0-9]+)[.]pickle$')
+
+def _prune(directory, catalog_key, version):
+    """Remove snapshot files for catalog_key older than model version."""
+    digest = hashlib.sha1(catalog_key).hexdigest()
+    for name in os.listdir(directory):
+        m = _snapshot_version.match(name)
+        if m and m.group(1) == digest and int(m.group(2)) < version:
+            try:
+                os.unlink(os.path.join(directory, name))
+            except OSError:
+                # another process pruned it first
+                pass
+
+def _load(path):
+    try:
+        f = open(path, 'rb')
+    except IOError:
+        return None
+    try:
+        snapshot_format, log = cPickle.loads(f.read())
+    finally:
+        f.close()
+    if snapshot_format != SNAPSHOT_FORMAT:
+        return None
+    return log
+
+def _save(path, log):
+    fd, tmppath = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.model-')
+    try:
+        f = os.fdopen(fd, 'wb')
+        try:
+            cPickle.dump((SNAPSHOT_FORMAT, log), f, cPickle.HIGHEST_PROTOCOL)
+        finally:
+            f.close()
+        # atomic so concurrent readers never see a partial file
+        os.rename(tmppath, path)
+    except:
+        os.unlink(tmppath)
+        raise
+
+def introspect_recorded(cur, config=None):
+    """Introspect model and return (model, log) recording the introspection."""
+    rcur = RecordingCursor(cur)
+    model = introspect(rcur, config)
+    return model, rcur.log
+
+def introspect_replayed(log, config=None, cur=None, live=lambda sql: False):
+    """Rebuild model from log and return (model, newlog).
+
+       Statements for which live(sql) is true are run on cur instead
+       of being replayed.
+    """
+    rcur = ReplayCursor(log, cur, live)
+    model = introspect(rcur, config)
+    return model, rcur.log
+
+def introspect_shared(cur, directory, catalog_key, version, config=None):
+    """Introspect model using a snapshot shared through directory when possible.
+
+       Returns (model, log) like introspect_recorded().  If a snapshot
+       for (catalog_key, version) exists, the model is rebuilt from it
+       without touching cur.  Otherwise cur is introspected and a new
+       snapshot is saved for other processes, replacing the
+       snapshots of older versions of the catalog.
+    """
+    path = snapshot_path(directory, catalog_key, version)
+    try:
+        log = _load(path)
+        if log is not None:
+            return introspect_replayed(log, config)
+    except Exception, e:
+        web.debug(u'ignoring unusable model snapshot %s: %s' % (path, unicode(e)))
+
+    model, log = introspect_recorded(cur, config)
+    if model.version == version:
+        try:
+            _save(path, log)
+            _prune(directory, catalog_key, version)
+        except (IOError, OSError), e:
+            web.debug(u'could not save model snapshot %s: %s' % (path, unicode(e)))
+    return model, log
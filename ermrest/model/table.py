@@ -58,6 +58,8 @@ class Table (object):
     also has a reference to its 'schema'.
     """
     
+    __slots__ = ('schema', 'name', 'kind', 'comment', 'columns', 'uniques', 'fkeys', 'annotations', 'acls', 'dynacls')
+
     def __init__(self, schema, name, columns, kind, comment=None, annotations={}, acls={}, dynacls={}):
         self.schema = schema
         self.name = name
@@ -131,6 +131,8 @@ class Type (object):
     is_array = False
     is_domain = False
     
+    __slots__ = ('name', 'length')
+
     def __init__(self, **args):
         self.name = args['typename']
         self.length = args.get('length')
@@ -232,6 +234,8 @@ class ArrayType(Type):
     """Represents an array type."""
     is_array = True
     
+    __slots__ = ('base_type',)
+
     def __init__(self, **args):
         args['typename'] = args['base_type'].name + "[]"
         Type.__init__(self, **args)
@@ -260,6 +264,8 @@ class DomainType(Type):
     """Represents a domain type."""
     is_domain = True
     
+    __slots__ = ('base_type',)
+
     def __init__(self, **args):
         Type.__init__(self, **args)
         self.base_type = args['base_type']
@@ -26,6 +26,13 @@ that may be more sophisticated than the SimpleRegistry implementation.
 """
 
 import json
+import os
+import time
+import select
+import threading
+import psycopg2
+import psycopg2.extensions
+import web
 
 from .util import *
 from . import sanepg2
@@ -45,7 +52,9 @@ def get_registry(config):
 
     return SimpleRegistry(
         dsn=config.get("dsn"),
-        acls=config.get("acls")
+        acls=config.get("acls"),
+        cache_ttl=config.get("cache_ttl", 60),
+        listen=config.get("listen", True)
         )
 
 
@@ -121,18 +130,117 @@ class SimpleRegistry(Registry):
        Operations use basic connection-pooling but each does its own
        transaction since requests are usually independent and simple
        lookup is the hot path.
+
+       Successful lookups of one catalog are cached in memory for up
+       to cache_ttl seconds.  With listen=True, a background thread
+       also LISTENs on the registry database so that register() and
+       unregister() in any process invalidate the cache promptly.
     """
 
-    def __init__(self, dsn, acls):
+    NOTIFY_CHANNEL = 'ermrest_registry'
+
+    # seconds to wait before reconnecting a failed listener
+    LISTEN_RETRY_INTERVAL = 10
+
+    def __init__(self, dsn, acls, cache_ttl=60, listen=True):
         """Initialized the SimpleRegistry.
         """
         super(SimpleRegistry, self).__init__(acls)
         self.dsn = dsn
+        self.cache_ttl = cache_ttl or 0
+        self.listen = listen
+        self._cache = dict() # id -> (expires, entries)
+        self._cache_generation = 0
+        self._cache_lock = threading.Lock()
+        self._listener = None
+        self._listener_pid = None
+
+    def _cache_get(self, id):
+        """Return cached lookup(id) result or None, starting listener if needed."""
+        self._cache_lock.acquire()
+        try:
+            self._start_listener()
+            entry = self._cache.get(id)
+            if entry is not None:
+                if entry[0] > time.time():
+                    return entry[1]
+                del self._cache[id]
+            return None
+        finally:
+            self._cache_lock.release()
+
+    def _cache_put(self, id, entries, generation):
+        """Cache lookup(id) result unless invalidated since generation was read."""
+        self._cache_lock.acquire()
+        try:
+            if generation == self._cache_generation:
+                self._cache[id] = (time.time() + self.cache_ttl, entries)
+        finally:
+            self._cache_lock.release()
 
-    def pooled_perform(self, body, post_commit=lambda x: x):
+    def invalidate(self, id=None):
+        """Discard cached lookup result for id, or all cached results if id is None."""
+        self._cache_lock.acquire()
+        try:
+            self._cache_generation += 1
+            if id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(id, None)
+        finally:
+            self._cache_lock.release()
+
+    def _start_listener(self):
+        """Start listener thread if needed.  Caller must hold self._cache_lock."""
+        if not self.listen:
+            return
+        if self._listener is not None and self._listener_pid == os.getpid() and self._listener.is_alive():
+            return
+        self._listener = threading.Thread(target=self._listener_loop, name='ermrest-registry-listener')
+        self._listener.daemon = True
+        self._listener_pid = os.getpid()
+        self._listener.start()
+
+    def _listener_loop(self):
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                cur = conn.cursor()
+                cur.execute("LISTEN %s;" % sql_identifier(self.NOTIFY_CHANNEL))
+                # changes before LISTEN took effect went unnoticed
+                self.invalidate()
+                while True:
+                    if select.select([conn], [], [], self.LISTEN_RETRY_INTERVAL) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self.invalidate(self._catalog_id(notify.payload))
+            except Exception, e:
+                web.debug(u'got exception "%s" in registry listener' % unicode(e))
+                # do not trust cache while not listening
+                self.invalidate()
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except:
+                        pass
+            time.sleep(self.LISTEN_RETRY_INTERVAL)
+
+    def _catalog_id(self, payload):
+        """Return integer catalog id from id or notification payload, or None."""
+        try:
+            return int(payload)
+        except (TypeError, ValueError):
+            return None
+
+    def pooled_perform(self, body, post_commit=lambda x: x, retry=False):
         pc = sanepg2.PooledConnection(self.dsn)
         try:
-            return pc.perform(body, post_commit).next()
+            return pc.perform(body, post_commit, retry=retry).next()
         finally:
             if pc is not None:
                 pc.final()
@@ -166,6 +274,14 @@ CREATE INDEX ON ermrest.simple_registry (created_on);
 
     def lookup(self, id=None):
         """See Registry.lookup()"""
+        key = self._catalog_id(id) if id and self.cache_ttl > 0 else None
+        generation = None
+        if key is not None:
+            entries = self._cache_get(key)
+            if entries is not None:
+                return entries
+            generation = self._cache_generation
+
         def body(conn, cur):
             filter = " AND id = %s" % sql_literal(id) if id else ""
 
@@ -182,7 +298,18 @@ WHERE deleted_on IS NULL
                 for eid, descriptor in cur
             ]
 
-        return self.pooled_perform(body)
+        entries = self.pooled_perform(body, retry=True)
+        if entries and generation is not None:
+            # only positive results are cached so new catalogs are found at once
+            self._cache_put(key, entries, generation)
+        return entries
+
+    def _notify(self, cur, id):
+        """Queue a registry change notification for other processes at commit."""
+        cur.execute("SELECT pg_notify(%s, %s);" % (
+            sql_literal(self.NOTIFY_CHANNEL),
+            sql_literal(id)
+        ))
 
     def register(self, descriptor, id=None):
         """See Registry.register()"""
@@ -197,9 +324,12 @@ RETURNING id;
 """ % dict(cols=','.join([sql_identifier(c) for c in entry.keys()]),
            values=','.join([sql_literal(v) for v in entry.values()])))
 
-            return cur.fetchone()[0]
+            id = cur.fetchone()[0]
+            self._notify(cur, id)
+            return id
 
         def post_commit(id):
+            self.invalidate(id)
             return dict(id=id, descriptor=descriptor)
 
         return self.pooled_perform(body, post_commit)
@@ -215,9 +345,13 @@ UPDATE ermrest.simple_registry
 SET deleted_on = current_timestamp
 WHERE deleted_on IS NULL AND id = %(id)s;
 """          % dict(id=sql_literal(id)))
-            return cur.rowcount > 0
+            deleted = cur.rowcount > 0
+            if deleted:
+                self._notify(cur, id)
+            return deleted
 
         def post_commit(deleted):
+            self.invalidate(self._catalog_id(id))
             if not deleted:
                 raise KeyError("catalog identifier ("+id+") does not exist")
 
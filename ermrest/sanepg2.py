@@ -44,16 +44,55 @@ import psycopg2.pool
 import web
 import sys
 import traceback
-import datetime
-import math
+import os
+import time
+import threading
+from collections import OrderedDict
 
 class connection (psycopg2.extensions.connection):
     """Customized psycopg2 connection factory with per-execution() cursor support.
 
     """
+    # limits for execute_prepared(), see configure_prepared_statements()
+    prepare_statements = True
+    max_prepared = 64
+
     def __init__(self, dsn):
         psycopg2.extensions.connection.__init__(self, dsn)
         self._curnumber  = 1
+        self._prepnumber = 1
+        self._prepared = OrderedDict() # (sql, types) -> statement name
+        self._prepared_version = None # model version the prepared statements were made for
+        self._created = time.time()
+        self._uses = 0
+        self.session_key = None
+        self._pending_session_key = None
+
+    def set_session_key(self, key):
+        """Record a key describing session settings changed by the current transaction.
+
+           The key becomes the connection's session_key when the
+           transaction commits and is forgotten if it rolls back, just
+           as the server keeps or discards session-level set_config()
+           changes.
+        """
+        self._pending_session_key = key
+
+    def session_matches(self, key):
+        """Return True if the session settings described by key are in effect."""
+        if self._pending_session_key is not None:
+            return key == self._pending_session_key
+        return key == self.session_key
+
+    def commit(self):
+        psycopg2.extensions.connection.commit(self)
+        if self._pending_session_key is not None:
+            self.session_key = self._pending_session_key
+            self._pending_session_key = None
+
+    def rollback(self):
+        self._pending_session_key = None
+        psycopg2.extensions.connection.rollback(self)
 
     def execute(self, stmt, vars=None):
         """Name and create a server-side cursor with withhold=True and run statement in it.
@@ -73,6 +112,58 @@ class connection (psycopg2.extensions.connection):
         cur.execute(stmt, vars=vars)
         return cur
 
+    def execute_prepared(self, cur, sql, types, literals, version=None):
+        """Run parameterized sql in cur as a prepared statement of this session.
+
+           The sql refers to its parameters as $1 ... $N with the SQL
+           type names in types, and literals are the SQL literals to
+           bind to them.  The statement is prepared the first time its
+           sql and types are seen on this connection, so later calls
+           only send EXECUTE and Postgres may reuse its plan.  At most
+           max_prepared statements are kept, deallocating the least
+           recently used ones.  All statements are deallocated when
+           the catalog model version differs from the one they were
+           prepared for, since the same sql may then yield other rows.
+
+           Prepared statements survive transaction rollback, so one is
+           only recorded after PREPARE succeeds.
+        """
+        if version != self._prepared_version:
+            if self._prepared:
+                cur.execute('DEALLOCATE ALL;')
+                self._prepared.clear()
+            self._prepared_version = version
+        key = (sql, tuple(types))
+        name = self._prepared.pop(key, None)
+        if name is None:
+            while self._prepared and len(self._prepared) >= self.max_prepared:
+                old_key = next(iter(self._prepared))
+                cur.execute('DEALLOCATE %s;' % self._prepared[old_key])
+                del self._prepared[old_key]
+            name = 'ermrest_stmt%d' % self._prepnumber
+            self._prepnumber += 1
+            if types:
+                cur.execute('PREPARE %s (%s) AS %s' % (name, ', '.join(types), sql))
+            else:
+                cur.execute('PREPARE %s AS %s' % (name, sql))
+        self._prepared[key] = name
+        if literals:
+            cur.execute('EXECUTE %s (%s)' % (name, ', '.join(literals)))
+        else:
+            cur.execute('EXECUTE %s' % name)
+
+def configure_prepared_statements(config=None):
+    """Apply limits from the "prepared_statements" configuration section.
+
+         enabled: run cached data queries as prepared statements (default True)
+         max_per_connection: statements kept per connection (default 64)
+
+    """
+    if config is None:
+        config = {}
+    connection.prepare_statements = bool(config.get('enabled', True))
+    connection.max_prepared = max(1, int(config.get('max_per_connection', 64)))
+
 def pool(minconn, maxconn, dsn):
     """Open a thread-safe connection pool with minconn <= N <= maxconn connections to database.
 
@@ -80,75 +171,427 @@ def pool(minconn, maxconn, dsn):
     """
     return psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, dsn=dsn, connection_factory=connection)
 
+class BoundedPool (object):
+    """A connection pool for one database drawing on its manager's global budget.
+
+       The pool opens at most maxconn connections and retains at most
+       minconn idle connections when they are returned.  Every open
+       connection also counts against the process-wide budget of the
+       owning PoolManager, and checkout waits in the manager's bounded
+       queue when either limit is reached.
+
+    """
+    def __init__(self, manager, dsn, minconn, maxconn):
+        assert 0 <= minconn <= maxconn
+        self.manager = manager
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.idle = []
+        self.nopen = 0
+        self.closed = False
+
+    def getconn(self, timeout=None):
+        """Get a connection, waiting at most timeout seconds for capacity.
+
+           With validate_on_checkout configured, a reused connection
+           is tested first and replaced if it no longer works.
+        """
+        while True:
+            conn = self.manager._checkout(self, timeout)
+            if conn._uses > 0 and self.manager.validate_on_checkout and not self.manager._validate(conn):
+                self.putconn(conn, close=True)
+                continue
+            conn._uses += 1
+            return conn
+
+    def putconn(self, conn, close=False):
+        """Return a connection to the pool, closing it if requested or surplus."""
+        self.manager._checkin(self, conn, close)
+
+    def closeall(self):
+        """Close idle connections and arrange for busy ones to close on return."""
+        self.manager._close_pool(self)
+
+    def closeidle(self):
+        """Close idle connections but keep pool open for new ones."""
+        self.manager._close_pool(self, keep_open=True)
+
 class PoolManager (object):
     """Manage a set of database connection pools keyed by database name.
 
+       All pools share one process-wide limit on open connections and
+       one bounded queue of threads waiting for a connection.  The
+       limits come from the "connection_pool" section of the ERMrest
+       configuration, passed to configure():
+
+         min_connections: idle connections retained per pool (default 1)
+         max_connections: open connections per pool (default 4)
+         max_total_connections: open connections in process (default None, unbounded)
+         max_waiters: threads allowed to wait for capacity (default 32)
+         wait_timeout: seconds a thread waits for capacity (default 5)
+         max_idle_seconds: idle time before a whole pool is closed (default 300)
+         reaper_interval: seconds between background idle sweeps (default 30)
+         validate_on_checkout: test reused connections before use (default False)
+         max_connection_age: seconds before a connection is recycled (default None)
+         max_connection_uses: checkouts before a connection is recycled (default None)
+         retry_idempotent: retry idempotent work on a fresh connection (default True)
+         catalogs: { key: { min_connections: N, max_connections: M }, ... }
+
+       The per-key overrides apply to pools created with a matching
+       key, e.g. the catalog ID for catalog connections.
+
     """
-    def __init__(self):
-        # map dsn -> [pool, timestamp]
+    def __init__(self, config=None):
+        # map dsn -> [pool, last use time.time()]
         self.pools = dict()
-        self.max_idle_seconds = 60 * 5 # 5 minutes
+        self._cond = threading.Condition()
+        self.total_connections = 0
+        self.waiters = 0
+        self.pools_closed = 0
+        self.connections_recycled = 0
+        self._reaper = None
+        self._reaper_pid = None
+        self.configure(config)
 
-    def __getitem__(self, dsn):
-        """Lookup existing or create new pool for database on demand.
+    def configure(self, config=None):
+        """Apply pool limits from configuration dictionary."""
+        if config is None:
+            config = {}
+        self.min_connections = int(config.get('min_connections', 1))
+        self.max_connections = int(config.get('max_connections', 4))
+        max_total = config.get('max_total_connections')
+        self.max_total_connections = int(max_total) if max_total is not None else None
+        self.max_waiters = int(config.get('max_waiters', 32))
+        self.wait_timeout = float(config.get('wait_timeout', 5))
+        self.max_idle_seconds = float(config.get('max_idle_seconds', 60 * 5)) # 5 minutes
+        self.reaper_interval = float(config.get('reaper_interval', 30))
+        self.validate_on_checkout = bool(config.get('validate_on_checkout', False))
+        max_age = config.get('max_connection_age')
+        self.max_connection_age = float(max_age) if max_age is not None else None
+        max_uses = config.get('max_connection_uses')
+        self.max_connection_uses = int(max_uses) if max_uses is not None else None
+        self.retry_idempotent = bool(config.get('retry_idempotent', True))
+        self.pool_overrides = dict([
+            (str(k), v) for k, v in config.get('catalogs', {}).items()
+        ])
+
+    def pool_sizes(self, key=None):
+        """Return (minconn, maxconn) for pools created with key."""
+        override = self.pool_overrides.get(str(key), {}) if key is not None else {}
+        minconn = int(override.get('min_connections', self.min_connections))
+        maxconn = int(override.get('max_connections', self.max_connections))
+        return (min(minconn, maxconn), maxconn)
 
-           May fail transiently and caller should retry.
+    def _reserve(self, pool):
+        """Reserve budget for one more connection in pool or return False.
 
+           Caller must hold self._cond.  When the process-wide budget
+           is exhausted, an idle connection of another pool is closed
+           to make room.
         """
-        # abandon old pools so they can be garbage collected
-        for key in self.pools.keys():
-            try:
-                pair = self.pools.pop(key)
-                delta = (datetime.datetime.now() - pair[1])
+        if pool.nopen >= pool.maxconn:
+            return False
+        if self.max_total_connections is None or self.total_connections < self.max_total_connections:
+            self.total_connections += 1
+            pool.nopen += 1
+            return True
+        for pair in self.pools.values():
+            other = pair[0]
+            if other is not pool and other.idle:
+                # transfer budget from a victim idle connection
+                victim = other.idle.pop(0)
+                other.nopen -= 1
+                pool.nopen += 1
                 try:
-                    delta_seconds = delta.total_seconds()
+                    victim.close()
                 except:
-                    delta_seconds = delta.seconds + delta.microseconds * math.pow(10,-6)
-                    
-                if delta_seconds < self.max_idle_seconds:
-                    # this pool is sufficiently active so put it back!
-                    boundpair = self.pools.setdefault(key, pair)
-                
-                if self.pools.get(key, [None])[0] != pair[0]:
-                    # our pool is not registered anymore
-                    pair[0].closeall()
-                        
-            except KeyError:
-                # another thread could have purged key before we got to it
-                pass
+                    pass
+                return True
+        return False
+
+    def _expired(self, conn, now=None):
+        """Return True if conn has exceeded its configured age or use limits."""
+        if self.max_connection_uses is not None and conn._uses >= self.max_connection_uses:
+            return True
+        if self.max_connection_age is not None:
+            if now is None:
+                now = time.time()
+            if (now - conn._created) >= self.max_connection_age:
+                return True
+        return False
+
+    def _validate(self, conn):
+        """Return True if conn can still run a trivial query."""
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1;')
+            cur.close()
+            conn.rollback()
+            return True
+        except (psycopg2.InterfaceError, psycopg2.OperationalError):
+            return False
 
+    def _release(self, pool):
+        """Release budget for one connection of pool.  Caller must hold self._cond."""
+        pool.nopen -= 1
+        self.total_connections -= 1
+        self._cond.notify_all()
+
+    def _checkout(self, pool, timeout=None):
+        if timeout is None:
+            timeout = self.wait_timeout
+        deadline = time.time() + timeout
+        waiting = False
+        expired = []
+        self._cond.acquire()
+        try:
+            while True:
+                if pool.closed:
+                    raise psycopg2.pool.PoolError('connection pool is closed')
+                while pool.idle:
+                    conn = pool.idle.pop()
+                    if self._expired(conn):
+                        expired.append(conn)
+                        self._release(pool)
+                        self.connections_recycled += 1
+                        continue
+                    return conn
+                if self._reserve(pool):
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise psycopg2.pool.PoolError('timed out waiting for a database connection')
+                if not waiting:
+                    if self.waiters >= self.max_waiters:
+                        raise psycopg2.pool.PoolError('too many requests waiting for database connections')
+                    self.waiters += 1
+                    waiting = True
+                self._cond.wait(remaining)
+        finally:
+            if waiting:
+                self.waiters -= 1
+            self._cond.release()
+            for conn in expired:
+                conn.close()
+
+        # open the reserved connection without blocking other threads
         try:
-            pair = self.pools[dsn]
-            pair[1] = datetime.datetime.now() # update timestamp
+            return psycopg2.connect(pool.dsn, connection_factory=connection)
+        except:
+            self._cond.acquire()
+            try:
+                self._release(pool)
+            finally:
+                self._cond.release()
+            raise
+
+    def _checkin(self, pool, conn, close=False):
+        if not close and not conn.closed:
+            status = conn.get_transaction_status()
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+
+        self._cond.acquire()
+        try:
+            retain = not (close or conn.closed or pool.closed or len(pool.idle) >= pool.minconn)
+            if retain and self._expired(conn):
+                retain = False
+                self.connections_recycled += 1
+            if retain:
+                pool.idle.append(conn)
+                self._cond.notify_all()
+            else:
+                self._release(pool)
+        finally:
+            self._cond.release()
+
+        if not retain and not conn.closed:
+            conn.close()
+
+    def _close_pool(self, pool, keep_open=False):
+        self._cond.acquire()
+        try:
+            if not keep_open:
+                pool.closed = True
+            idle = pool.idle
+            pool.idle = []
+            for conn in idle:
+                self._release(pool)
+            if keep_open:
+                self.connections_recycled += len(idle)
+        finally:
+            self._cond.release()
+
+        for conn in idle:
+            conn.close()
+
+    def __getitem__(self, dsn):
+        return self.get(dsn)
+
+    def get(self, dsn, key=None):
+        """Lookup existing or create new pool for database on demand.
+
+           The key selects per-pool size overrides when a new pool is
+           created.  Idle pools are closed by the background reaper,
+           so this lookup does constant work.
+
+        """
+        self._cond.acquire()
+        try:
+            self._start_reaper()
+            pair = self.pools.get(dsn)
+            if pair is None:
+                minconn, maxconn = self.pool_sizes(key)
+                pair = [BoundedPool(self, dsn, minconn, maxconn), None]
+                self.pools[dsn] = pair
+            pair[1] = time.time() # update timestamp
             return pair[0]
-        except KeyError:
-            # atomically get/set pool
-            newpool = pool(1, 4, dsn)
-            boundpair = self.pools.setdefault(dsn, [newpool, datetime.datetime.now()])
-            if boundpair[0] is not newpool:
-                # someone beat us to it
-                newpool.closeall()
-            return boundpair[0]
-            
+        finally:
+            self._cond.release()
+
+    def _start_reaper(self):
+        """Start reaper thread if needed.  Caller must hold self._cond."""
+        if self.reaper_interval <= 0:
+            return
+        if self._reaper is not None and self._reaper_pid == os.getpid() and self._reaper.is_alive():
+            return
+        self._reaper = threading.Thread(target=self._reaper_loop, name='sanepg2-pool-reaper')
+        self._reaper.daemon = True
+        self._reaper_pid = os.getpid()
+        self._reaper.start()
+
+    def _reaper_loop(self):
+        while True:
+            time.sleep(self.reaper_interval)
+            try:
+                self.reap()
+            except Exception, e:
+                web.debug(u'got exception "%s" during sanepg2.PoolManager.reap()' % unicode(e))
+
+    def reap(self, now=None):
+        """Close pools which have been idle longer than max_idle_seconds.
+
+           Pools with connections checked out are never closed, but
+           their idle connections past max_connection_age are.  This
+           normally runs in the background reaper thread.
+        """
+        if now is None:
+            now = time.time()
+        victims = []
+        self._cond.acquire()
+        try:
+            for dsn, pair in self.pools.items():
+                pool, timestamp = pair
+                busy = pool.nopen - len(pool.idle)
+                if busy == 0 and (now - timestamp) >= self.max_idle_seconds:
+                    del self.pools[dsn]
+                    pool.closed = True
+                    for conn in pool.idle:
+                        self._release(pool)
+                    victims.extend(pool.idle)
+                    pool.idle = []
+                    self.pools_closed += 1
+                else:
+                    # recycle idle connections past their lifetime
+                    expired = [ conn for conn in pool.idle if self._expired(conn, now) ]
+                    for conn in expired:
+                        pool.idle.remove(conn)
+                        self._release(pool)
+                    victims.extend(expired)
+            self.connections_recycled += len(victims)
+        finally:
+            self._cond.release()
+
+        for conn in victims:
+            conn.close()
+
+    def stats(self):
+        """Return a dictionary of pool and reaper counters."""
+        self._cond.acquire()
+        try:
+            return dict(
+                pools=len(self.pools),
+                total_connections=self.total_connections,
+                idle_connections=sum([ len(pair[0].idle) for pair in self.pools.values() ]),
+                waiters=self.waiters,
+                pools_closed=self.pools_closed,
+                connections_recycled=self.connections_recycled,
+            )
+        finally:
+            self._cond.release()
 
 pools = PoolManager()       
 
 class PooledConnection (object):
-    def __init__(self, dsn):
-        self.used_pool = pools[dsn]
+    def __init__(self, dsn, key=None):
+        self.key = key
+        self.used_pool = pools.get(dsn, key)
+        self.conn = None
+        # set when request state depends on the open transaction's snapshot,
+        # e.g. a replica currency check or a model bound by start()
+        self.snapshot_pinned = False
+        self._connect()
+
+    def _connect(self):
         self.conn = self.used_pool.getconn()
         self.conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ)
         self.cur = self.conn.cursor()
 
-    def perform(self, bodyfunc, finalfunc=lambda x: x, verbose=False):
+    def _retrying(self, func, retry):
+        """Run func(conn, cur), retrying once if connection was lost."""
+        retry = retry and self.used_pool.manager.retry_idempotent
+        while True:
+            try:
+                return func(self.conn, self.cur)
+            except (psycopg2.InterfaceError, psycopg2.OperationalError), e:
+                if not retry or not self.conn.closed:
+                    raise
+                retry = False
+                web.debug(u'retrying sanepg2.PooledConnection work after lost connection: %s' % unicode(e))
+                # idle siblings of a lost connection are likely lost too
+                self.used_pool.putconn(self.conn, close=True)
+                self.conn = None
+                self.used_pool.closeidle()
+                self._connect()
+
+    def _perform_body(self, bodyfunc, retry):
+        """Run bodyfunc(conn, cur) and commit, retrying once if connection was lost."""
+        def body(conn, cur):
+            result = bodyfunc(conn, cur)
+            conn.commit()
+            return result
+        return self._retrying(body, retry)
+
+    def start(self, func):
+        """Run func(conn, cur) as the first work in the open transaction and return its result.
+
+           A pooled connection may have been lost while idle, e.g. by
+           a database restart, so func must be idempotent and it is
+           run a second time on a fresh connection if the first one
+           is lost, unless the snapshot is pinned.  The transaction is
+           left open for a later perform(), and its snapshot is pinned
+           since the caller may keep state derived from it.
+        """
+        result = self._retrying(func, not self.snapshot_pinned)
+        self.snapshot_pinned = True
+        return result
+
+    def perform(self, bodyfunc, finalfunc=lambda x: x, verbose=False, retry=False):
         """Run bodyfunc(conn, cur) using pooling, commit, transform with finalfunc, clean up.
         
            Automates handling of errors.
+
+           With retry=True, bodyfunc must be idempotent and it is run
+           a second time on a fresh connection if the first one is
+           lost before the transaction commits, unless the snapshot is
+           pinned.
         """
         assert self.conn is not None
         try:
-            result = bodyfunc(self.conn, self.cur)
-            self.conn.commit()
+            result = self._perform_body(bodyfunc, retry and not self.snapshot_pinned)
             result = finalfunc(result)
             if hasattr(result, 'next'):
                 # need to defer cleanup to after result is drained
@@ -156,10 +599,16 @@ class PooledConnection (object):
                     yield d
             else:
                 yield result
+        except psycopg2.extensions.QueryCanceledError, e:
+            # statement timeout leaves the connection usable
+            if self.conn is not None:
+                self.conn.rollback()
+            raise e
         except (psycopg2.InterfaceError, psycopg2.OperationalError), e:
             # reset bad connection
-            self.used_pool.putconn(self.conn, close=True)
-            self.conn = None
+            if self.conn is not None:
+                self.used_pool.putconn(self.conn, close=True)
+                self.conn = None
             raise e
         except GeneratorExit, e:
             # happens normally at end of result yielding sequence
@@ -22,8 +22,13 @@ url_parse_func( uri_text ):
     returns an abstract syntax tree consisting of instances of classes
     from the ast sub-module.
 
+url_parse_ir( uri_text ):
+
+    returns the cached, immutable intermediate representation from
+    which url_parse_func binds the abstract syntax tree.
+
 """
 
-from parse import url_parse_func
+from parse import url_parse_func, url_parse_ir, url_parse_cache
 import ast
 
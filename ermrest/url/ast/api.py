@@ -18,7 +18,6 @@
 """ERMREST URL abstract syntax tree (AST) for data resource path-addressing.
 
 """
-import psycopg2
 import web
 import traceback
 import sys
@@ -27,18 +26,34 @@ import re
 from ...exception import *
 from ... import sanepg2
 from ...util import sql_literal, negotiated_content_type
+from ...model.misc import rights_cache
 import json
 
 
 class Api (object):
 
+    # largest whole seconds Postgres accepts as statement_timeout
+    MAX_STATEMENT_TIMEOUT = 2147483
+
     def __init__(self, catalog):
         self.catalog = catalog
         self.queryopts = dict()
         self.sort = None
         self.before = None
         self.after = None
-        web.ctx.ermrest_catalog_model = catalog.manager.get_model()
+        if web.ctx.ermrest_catalog_model is None:
+            # set client session state and get model version in one round trip,
+            # reconnecting if the pooled connection went stale while idle
+            web.ctx.ermrest_catalog_model = web.ctx.ermrest_catalog_pc.start(
+                lambda conn, cur: catalog.manager.get_model(prologue=self.session_prologue(conn))
+            )
+            # share access decisions with other requests using this cached model
+            web.ctx.ermrest_catalog_key = str(catalog.manager.descriptor)
+            web.ctx.ermrest_model_rights_cache = rights_cache.decisions(
+                web.ctx.ermrest_catalog_key,
+                web.ctx.ermrest_catalog_model,
+                web.ctx.ermrest_client_roles
+            )
         self.http_vary = web.ctx.webauthn2_manager.get_http_vary()
         self.http_etag = None
 
@@ -224,22 +239,25 @@ class Api (object):
         if self.http_etag:
             web.header('ETag', '%s' % self.http_etag)
         
-    def perform(self, body, finish):
-        def wrapbody(conn, cur):
-            try:
-                client = web.ctx.webauthn2_context.client
-                if type(client) is dict:
-                    client_obj = client
-                    client = client['id']
-                else:
-                    client_obj = { 'id': client }
-
-                attributes = [
-                    a['id'] if type(a) is dict else a
-                    for a in web.ctx.webauthn2_context.attributes
-                ]
-                
-                cur.execute("""
+    def session_prologue(self, conn):
+        """Return SQL to set client session state on conn, or '' if already set.
+
+           The settings are session-level, so a pooled connection
+           last used by the same client identity can skip them.
+        """
+        client = web.ctx.webauthn2_context.client
+        if type(client) is dict:
+            client_obj = client
+            client = client['id']
+        else:
+            client_obj = { 'id': client }
+
+        attributes = [
+            a['id'] if type(a) is dict else a
+            for a in web.ctx.webauthn2_context.attributes
+        ]
+
+        sql = """
 SELECT set_config('webauthn2.client', %s, false);
 SELECT set_config('webauthn2.client_json', %s, false);
 SELECT set_config('webauthn2.attributes', %s, false);
@@ -253,12 +271,66 @@ SELECT set_config('webauthn2.attributes_array', (ARRAY[%s]::text[])::text, false
         for attr in attributes
     ])
 )
+        if conn.session_matches(sql):
+            return ''
+        conn.set_session_key(sql)
+        return sql
+
+    def client_wait(self):
+        """Return seconds from the client's "Prefer: wait=N" header, or None.
+
+           Per RFC 7240, the client expects a response within N
+           seconds, where N is a non-negative integer.  Malformed
+           preferences are ignored, and N is clamped to
+           MAX_STATEMENT_TIMEOUT.
+        """
+        for pref in web.ctx.env.get('HTTP_PREFER', '').split(','):
+            name, sep, value = pref.split(';')[0].partition('=')
+            if name.strip().lower() == 'wait':
+                value = value.strip().strip('"')
+                if not value.isdigit():
+                    return None
+                wait = min(int(value), self.MAX_STATEMENT_TIMEOUT)
+                return wait if wait > 0 else None
+        return None
+
+    def statement_timeout(self):
+        """Return statement timeout seconds for this request, or None for no limit.
+
+           The per-method limits in the "statement_timeout" config
+           section may be overridden per catalog ID, and the client
+           may only lower them with a "Prefer: wait=N" header.
+        """
+        config = web.ctx.ermrest_config.get('statement_timeout') or {}
+        method = 'GET' if web.ctx.method == 'HEAD' else web.ctx.method
+        override = config.get('catalogs', {}).get(str(self.catalog.catalog_id), {})
+        timeout = override.get(method, config.get(method))
+        wait = self.client_wait()
+        if wait is not None and (timeout is None or wait < timeout):
+            timeout = wait
+        if timeout is not None:
+            timeout = min(timeout, self.MAX_STATEMENT_TIMEOUT)
+        return timeout
+
+    def perform(self, body, finish):
+        timeout = self.statement_timeout()
+
+        def wrapbody(conn, cur):
+            # normally a no-op after the prologue in __init__, but a
+            # retry may have switched to another connection
+            prologue = self.session_prologue(conn)
+            if timeout is not None:
+                # local to this transaction, so pooled sessions keep their default
+                prologue += "SELECT set_config('statement_timeout', %s, true);\n" % sql_literal(
+                    '%dms' % max(1, int(timeout * 1000))
                 )
-                return body(conn, cur)
-            except psycopg2.InterfaceError, e:
-                raise rest.ServiceUnavailable("Please try again.")
+            if prologue:
+                cur.execute(prologue)
+            return body(conn, cur)
             
-        return web.ctx.ermrest_catalog_pc.perform(wrapbody, finish)
+        # safe methods are idempotent and can be retried on a fresh connection
+        retry = web.ctx.method in ('GET', 'HEAD')
+        return web.ctx.ermrest_catalog_pc.perform(wrapbody, finish, retry=retry)
     
     def final(self):
         if self.catalog is not self:
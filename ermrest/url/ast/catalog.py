@@ -115,12 +115,29 @@ class Catalog (Api):
             )
         
         assert web.ctx.ermrest_catalog_pc is None
-        web.ctx.ermrest_catalog_pc = sanepg2.PooledConnection(self.manager.dsn)
+        if web.ctx.method in ('GET', 'HEAD') and self.manager.replica_dsns:
+            # read-only requests may use a replica as current as the client's ETag
+            web.ctx.ermrest_catalog_pc = self.manager.replica_connection(self.client_data_version(), key=catalog_id)
+        if web.ctx.ermrest_catalog_pc is None:
+            web.ctx.ermrest_catalog_pc = sanepg2.PooledConnection(self.manager.dsn, key=catalog_id)
 
         Api.__init__(self, self)
         # now enforce read permission
         self.enforce_right('enumerate', 'catalog/' + str(self.catalog_id))
 
+    def client_data_version(self):
+        """Return the newest version named by the client's ETag preconditions, or None."""
+        versions = []
+        for header in ['HTTP_IF_NONE_MATCH', 'HTTP_IF_MATCH']:
+            for etag in self.parse_client_etags(web.ctx.env.get(header, '')):
+                if etag is True:
+                    continue
+                try:
+                    versions.append(int(etag.strip('"').split(';')[-1]))
+                except ValueError:
+                    pass
+        return max(versions) if versions else None
+
     def final(self):
         web.ctx.ermrest_catalog_pc.final()
 
@@ -78,6 +78,10 @@ def _GET(handler, uri, dresource, vresource):
         results = None
         
     def body(conn, cur):
+        if results is not None:
+            # discard partial output, in case of retry
+            results.seek(0)
+            results.truncate()
         handler.set_http_etag( vresource.get_data_version(cur) )
         handler.http_check_preconditions()
         dresource.add_sort(handler.sort)
@@ -87,6 +87,9 @@ class FilterElem (PathElem):
     def sql_where(self, epath, elem, prefix=''):
         return self.pred.sql_where(epath, elem, prefix=prefix)
 
+    def sql_shape(self, values):
+        return self.pred.sql_shape(values)
+
     def validate_attribute_update(self, apath):
         return self.pred.validate_attribute_update(apath)
 
@@ -20,11 +20,14 @@
 """
 
 import json
+import gzip
+import cStringIO
 import web
 
 from ... import exception
 from ... import model
 from .api import Api
+from ...catalog import rendered_model_cache
 from ...util import negotiated_content_type
 
 def _post_commit(handler, resource, content_type='text/plain', transform=lambda v: v):
@@ -39,7 +42,71 @@ def _post_commit(handler, resource, content_type='text/plain', transform=lambda
     web.header('Content-Length', len(response))
     return response
 
+def _accepts_gzip():
+    """Return True if the client accepts a gzip content-encoding."""
+    for part in web.ctx.env.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        params = [ p.strip() for p in part.split(';') ]
+        if params[0].lower() in ('gzip', 'x-gzip'):
+            for p in params[1:]:
+                if p[0:2] == 'q=':
+                    try:
+                        return float(p[2:]) > 0
+                    except ValueError:
+                        return False
+            return True
+    return False
+
+def _gzip(data):
+    buf = cStringIO.StringIO()
+    # fixed mtime so every process renders identical bytes
+    f = gzip.GzipFile(fileobj=buf, mode='wb', mtime=0)
+    f.write(data)
+    f.close()
+    return buf.getvalue()
+
+def _rendered_key(handler, resource):
+    """Return rendered model cache key for resource or None if not cacheable."""
+    modelobj = web.ctx.ermrest_catalog_model
+    if isinstance(resource, model.Model):
+        rkey = ()
+    elif isinstance(resource, model.Schema):
+        rkey = (resource.name,)
+    elif isinstance(resource, model.Table):
+        rkey = (resource.schema.name, resource.name)
+    else:
+        return None
+    return (str(handler.catalog.manager.descriptor), modelobj.version, rkey, modelobj.visibility_key())
+
+def _post_commit_rendered_json(handler, resource, key):
+    """Respond with a cached rendering of resource, which is identical for all clients sharing key."""
+    if 'accept-encoding' not in [ v.lower() for v in handler.http_vary ]:
+        handler.http_vary = list(handler.http_vary) + ['accept-encoding']
+    encoding = 'gzip' if _accepts_gzip() else 'identity'
+    response = rendered_model_cache.get(key, encoding)
+    if response is None:
+        plain = rendered_model_cache.get(key, 'identity')
+        if plain is None:
+            plain = json.dumps(resource.prejson(), indent=2) + '\n'
+            rendered_model_cache.put(key, 'identity', plain)
+        if encoding == 'gzip':
+            response = _gzip(plain)
+            rendered_model_cache.put(key, encoding, response)
+        else:
+            response = plain
+    if encoding == 'gzip':
+        # same ETag suffix as mod_deflate, which precondition checks ignore
+        handler.http_etag = handler.http_etag[0:-1] + '-gzip"'
+        web.header('Content-Encoding', 'gzip')
+    handler.emit_headers()
+    web.header('Content-Type', 'application/json')
+    web.header('Content-Length', len(response))
+    return response
+
 def _post_commit_json(handler, resource):
+    if web.ctx.method == 'GET' and rendered_model_cache.enabled:
+        key = _rendered_key(handler, resource)
+        if key is not None:
+            return _post_commit_rendered_json(handler, resource, key)
     def prejson(v):
         if hasattr(v, 'prejson'):
             return v.prejson()
@@ -62,16 +129,30 @@ def _GET(handler, thunk, _post_commit):
     return handler.perform(body, lambda resource: _post_commit(handler, resource))
 
 def _MODIFY(handler, thunk, _post_commit):
+    changed = [ None ] # model version recorded by our last body attempt
+
     def body(conn, cur):
         # we need a private (uncached) copy of model because we mutate it optimistically
         # and this could corrupt a cached copy if our operation is not committed to DB
+        # ...and decisions or SQL on it must not leak into the shared caches
+        web.ctx.ermrest_model_rights_cache = dict()
+        web.ctx.ermrest_catalog_key = None
         web.ctx.ermrest_catalog_model = handler.catalog.manager.get_model(cur, private=True)
         handler.set_http_etag( web.ctx.ermrest_catalog_model.version )
         handler.http_check_preconditions(method='PUT')
         result = thunk(conn, cur)
+        if getattr(handler, 'model_overlay_only', False):
+            handler.catalog.manager.mark_overlay_change(cur)
         handler.set_http_etag( handler.catalog.manager.get_model_update_version(cur) )
+        changed[0] = handler.catalog.manager.get_model_change_version(cur)
         return result
-    return handler.perform(body, lambda resource: _post_commit(handler, resource))
+
+    def finish(resource):
+        if changed[0] is not None:
+            handler.catalog.manager.model_changed(changed[0])
+        return _post_commit(handler, resource)
+
+    return handler.perform(body, finish)
 
 def _MODIFY_with_json_input(handler, thunk, _post_commit):
     try:
@@ -265,6 +346,9 @@ class Tables (Api):
         return _MODIFY_with_json_input(self, self.POST_body, post_commit)
 
 class AclCommon (Api):
+    # changes leave catalog structure intact
+    model_overlay_only = True
+
     def __init__(self, catalog, subject):
         Api.__init__(self, catalog)
         self.subject = subject
@@ -515,6 +599,9 @@ class ForeignkeyReferencesComment (Comment):
         return fkrs[0]
 
 class Annotations (Api):
+    # changes leave catalog structure intact
+    model_overlay_only = True
+
     def __init__(self, catalog, subject):
         Api.__init__(self, catalog)
         self.subject = subject
@@ -0,0 +1,123 @@
+
+# 
+# Copyright 2010-2017 University of Southern California
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#    http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""ERMREST URL intermediate representation (IR).
+
+The URL grammar produces a tree of deferred calls instead of AST
+objects.  Binding the tree performs those calls, e.g. looking up the
+catalog and resolving names against its model, to build a fresh AST
+for the current request.  Since parsing then has no side effects, the
+tree for a URL can be cached and bound again by later requests.
+
+IR nodes are never mutated after construction.
+
+"""
+
+from ..model.name import Name
+
+def bind(v):
+    """Return a fresh AST for IR v, or v itself if it is a plain value."""
+    if isinstance(v, Node):
+        return v.bind()
+    return v
+
+class Node (object):
+    """Abstract IR node."""
+    __slots__ = ()
+
+    def bind(self):
+        raise NotImplementedError()
+
+class Call (Node):
+    """Deferred func(*args)."""
+    __slots__ = ('func', 'args')
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def bind(self):
+        return self.func(*[ bind(a) for a in self.args ])
+
+class Method (Node):
+    """Deferred target.name(*args) returning its result."""
+    __slots__ = ('target', 'name', 'args')
+
+    def __init__(self, target, name, *args):
+        self.target = target
+        self.name = name
+        self.args = args
+
+    def bind(self):
+        target = bind(self.target)
+        return getattr(target, self.name)(*[ bind(a) for a in self.args ])
+
+class Update (Method):
+    """Deferred target.name(*args) returning the target itself."""
+    __slots__ = ()
+
+    def bind(self):
+        target = bind(self.target)
+        getattr(target, self.name)(*[ bind(a) for a in self.args ])
+        return target
+
+class List (Node):
+    """Deferred list-like container of bound items."""
+    __slots__ = ('cls', 'items')
+
+    def __init__(self, items=(), cls=list):
+        self.cls = cls
+        self.items = tuple(items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def extended(self, item):
+        """Return a new List with item appended."""
+        return List(self.items + (item,), self.cls)
+
+    def bind(self):
+        return self.cls([ bind(i) for i in self.items ])
+
+class NameNode (Node):
+    """Deferred Name with constant nameparts."""
+    __slots__ = ('nameparts',)
+
+    def __init__(self, nameparts=()):
+        self.nameparts = tuple(nameparts)
+
+    def __unicode__(self):
+        return ':'.join(self.nameparts)
+
+    def __str__(self):
+        return (unicode(self)).encode('utf8')
+
+    def __len__(self):
+        return len(self.nameparts)
+
+    def __iter__(self):
+        return iter(self.nameparts)
+
+    def with_suffix(self, namepart):
+        """Return a new NameNode with namepart appended."""
+        return NameNode(self.nameparts + (namepart,))
+
+    def bind(self):
+        return Name(self.nameparts)
@@ -36,6 +36,8 @@ any request bearing escaped slashes meant to be user data.
 
 import ply.lex
 import web
+import sys
+import hashlib
 
 from ..exception import *
 from ..util import urlunquote
@@ -137,6 +139,40 @@ def t_error(t):
     web.debug(t)
     raise LexicalError()
 
+# lexer tables generated at build time, see write_tables()
+lextab = 'ermrest.url.url_lextab'
+
+def lexer_signature():
+    """Return a digest of the token rules which lexer tables are built from."""
+    rules = [
+        (name, rule) for name, rule in globals().items()
+        if name.startswith('t_')
+    ]
+    # function rules are tried in definition order
+    rules.sort(key=lambda r: getattr(r[1], 'func_code', None) and r[1].func_code.co_firstlineno)
+    parts = [ sorted(tokens), literals ] + [
+        (name, rule.__doc__ if callable(rule) else rule)
+        for name, rule in rules
+    ]
+    return hashlib.md5(repr(parts)).hexdigest()
+
 def make_lexer():
-    return ply.lex.lex(debug=False, optimize=1, lextab=None)#'url_lextab')
+    try:
+        __import__(lextab)
+        if getattr(sys.modules[lextab], '_lexsignature', None) == lexer_signature():
+            return ply.lex.lex(debug=False, optimize=1, lextab=lextab)
+    except ImportError:
+        pass
+    # tables are missing or stale so build them in memory instead
+    return ply.lex.lex(debug=False, optimize=0)
+
+def write_tables(outputdir):
+    """Write lexer tables module with its rule signature into outputdir."""
+    lexer = ply.lex.lex(debug=False, optimize=0)
+    lexer.writetab(lextab, outputdir)
+    f = open('%s/%s.py' % (outputdir, lextab.split('.')[-1]), 'a')
+    try:
+        f.write('_lexsignature = %r\n' % lexer_signature())
+    finally:
+        f.close()
 
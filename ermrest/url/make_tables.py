@@ -0,0 +1,56 @@
+#!/usr/bin/python
+#
+# Copyright 2010-2017 University of Southern California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Write URL lexer or parser tables at build time.
+
+   usage: python ermrest/url/make_tables.py {lex|parse} outputdir
+
+The ermrest, ermrest.url and ermrest.url.ast packages are registered
+without running their __init__ modules, so generating the tables does
+not load the service configuration, start background threads or
+import the request handlers.  Grammar actions only use the AST classes
+when parsing, which never happens here.
+
+"""
+
+import os
+import sys
+import imp
+
+def _bare_package(name, path):
+    """Register package name at path without running its __init__ module."""
+    module = imp.new_module(name)
+    module.__path__ = [path]
+    sys.modules[name] = module
+    return module
+
+def main(kind, outputdir):
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    # don't let modules in this directory shadow top-level ones, e.g. ast
+    sys.path[0] = root
+    _bare_package('ermrest', os.path.join(root, 'ermrest'))
+    _bare_package('ermrest.url', os.path.join(root, 'ermrest', 'url'))
+    _bare_package('ermrest.url.ast', os.path.join(root, 'ermrest', 'url', 'ast'))
+    module = __import__('ermrest.url.%s' % kind, fromlist=['write_tables'])
+    module.write_tables(outputdir)
+    return 0
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3 or sys.argv[1] not in ('lex', 'parse'):
+        sys.stderr.write('usage: %s {lex|parse} outputdir\n' % sys.argv[0])
+        sys.exit(2)
+    sys.exit(main(sys.argv[1], sys.argv[2]))
@@ -19,23 +19,25 @@
 
 This grammar parses whole URL text for all ERMREST REST URL formats,
 handling the complex syntax allowed under each API prefix.  The resulting
-abstract syntax tree (AST) 
+intermediate representation (IR) is bound to an abstract syntax tree
+(AST) for each request.
 
 """
 
 import ply.yacc as yacc
 import threading
+import copy
 import web
 import urllib
+from collections import OrderedDict
 
 from ..exception import *
 from ..model import predicate
 
 from lex import make_lexer, tokens, keywords
+from ir import bind, Call, Method, Update, List, NameNode
 import ast
 
-url_parse_func = None
-
 ################################################
 # here's the grammar and ast production rules
 
@@ -84,7 +86,7 @@ def p_apis(p):
 
 def p_start(p):
     """start : api queryopts"""
-    p[0] = p[1].with_queryopts(p[2])
+    p[0] = Method(p[1], 'with_queryopts', p[2])
 
 def p_slashopt(p):
     """slashopt : '/' 
@@ -93,7 +95,7 @@ def p_slashopt(p):
 
 def p_catalog(p):
     """catalog : '/' string '/' CATALOG '/' NUMSTRING """ 
-    p[0] = ast.Catalog(p[6])
+    p[0] = Call(ast.Catalog, p[6])
 
 def p_catalogslash(p):
     """catalogslash : catalog '/' """
@@ -101,7 +103,7 @@ def p_catalogslash(p):
 
 def p_meta(p):
     """meta : catalogslash META slashopt """
-    p[0] = p[1].meta()
+    p[0] = Method(p[1], 'meta')
 
 def p_data(p):
     """data : entity
@@ -112,99 +114,89 @@ def p_data(p):
 
 def p_data_sort(p):
     """datasort : data '@' SORT '(' sortlist ')' """
-    p[0] = p[1].with_sort(p[5])
+    p[0] = Method(p[1], 'with_sort', p[5])
 
 def p_sortlist(p):
     """sortlist : sortitem"""
-    p[0] = ast.SortList([ p[1] ])
+    p[0] = List([ p[1] ], ast.SortList)
 
 def p_sortlist_grow(p):
     """sortlist : sortlist ',' sortitem"""
-    p[0] = p[1]
-    p[0].append( p[3] )
+    p[0] = p[1].extended( p[3] )
 
 def p_data_page_before(p):
     """datasort : datasort '@' BEFORE '(' pagelist ')' """
-    p[0] = p[1].with_before(p[5])
+    p[0] = Method(p[1], 'with_before', p[5])
 
 def p_data_page_after(p):
     """datasort : datasort '@' AFTER '(' pagelist ')' """
-    p[0] = p[1].with_after(p[5])
+    p[0] = Method(p[1], 'with_after', p[5])
 
 def p_pagelist(p):
     """pagelist : pageitem"""
-    p[0] = ast.PageList([ p[1] ])
+    p[0] = List([ p[1] ], ast.PageList)
 
 def p_pagelist_grow(p):
     """pagelist : pagelist ',' pageitem"""
-    p[0] = p[1]
-    p[0].append( p[3] )
+    p[0] = p[1].extended( p[3] )
     
 def p_meta_key(p):
     """meta : catalogslash META '/' string """
-    p[0] = p[1].meta(p[4])
+    p[0] = Method(p[1], 'meta', p[4])
 
 def p_textfacet(p):
     """textfacet : catalogslash TEXTFACET '/' string """
-    p[0] = p[1].textfacet(predicate.Value(p[4]))
+    p[0] = Method(p[1], 'textfacet', Call(predicate.Value, p[4]))
     
 def p_entity(p):
     """entity : catalogslash ENTITY '/' entityelem1 """
-    p[0] = p[1].entity(p[4])
+    p[0] = Method(p[1], 'entity', p[4])
 
 def p_attribute(p):
     """attribute : attribute_epath '/' attributeleaf """
-    p[0] = p[1]
-    p[0].set_projection(p[3])
+    p[0] = Update(p[1], 'set_projection', p[3])
 
 def p_attributegroup(p):
     """attributegroup : attributegroup_epath '/' groupkeys ';' groupleaf """
-    p[0] = p[1]
-    p[0].set_projection(p[3], p[5])
+    p[0] = Update(p[1], 'set_projection', p[3], p[5])
     
 def p_attributegroup_keysonly(p):
     """attributegroup : attributegroup_epath '/' groupkeys"""
-    p[0] = p[1]
-    p[0].set_projection(p[3], ast.NameList())
+    p[0] = Update(p[1], 'set_projection', p[3], List([], ast.NameList))
     
 def p_aggregate(p):
     """aggregate : aggregate_epath '/' groupleaf"""
-    p[0] = p[1]
-    p[0].set_projection(p[3])
+    p[0] = Update(p[1], 'set_projection', p[3])
 
 
 def p_attribute_epath(p):
     """attribute_epath : catalogslash ATTRIBUTE '/' entityelem1 """
-    p[0] = p[1].attribute(p[4])
+    p[0] = Method(p[1], 'attribute', p[4])
     
 def p_attributegroup_epath(p):
     """attributegroup_epath : catalogslash ATTRIBUTEGROUP '/' entityelem1 """
-    p[0] = p[1].attributegroup(p[4])
+    p[0] = Method(p[1], 'attributegroup', p[4])
     
 def p_aggregate_epath(p):
     """aggregate_epath : catalogslash AGGREGATE '/' entityelem1 """
-    p[0] = p[1].aggregate(p[4])
+    p[0] = Method(p[1], 'aggregate', p[4])
 
 
 def p_entity_grow(p):
     """entity : entity '/' entityelem2 """
-    p[0] = p[1]
-    p[0].append(p[3])
+    p[0] = Update(p[1], 'append', p[3])
 
 def p_attribute_grow(p):
     """attribute_epath : attribute_epath '/' entityelem2 """
-    p[0] = p[1]
-    p[0].append(p[3])
+    p[0] = Update(p[1], 'append', p[3])
 
 def p_attributegroup_grow(p):
     """attributegroup_epath : attributegroup_epath '/' entityelem2 """
-    p[0] = p[1]
-    p[0].append(p[3])
+    p[0] = Update(p[1], 'append', p[3])
 
 def p_aggregate_grow(p):
     """aggregate_epath : aggregate_epath '/' entityelem2 """
-    p[0] = p[1]
-    p[0].append(p[3])
+    p[0] = Update(p[1], 'append', p[3])
 
 
 def p_aleaf(p):
@@ -222,16 +214,15 @@ def p_groupleaf(p):
 
 def p_entityelem_single(p):
     """entityelem : sname """
-    p[0] = ast.data.path.TableElem(p[1])
+    p[0] = Call(ast.data.path.TableElem, p[1])
 
 def p_entityelem1(p):
     """entityelem1 : sname """
-    p[0] = ast.data.path.TableElem(p[1])
+    p[0] = Call(ast.data.path.TableElem, p[1])
 
 def p_entityelem1_bind(p):
     """entityelem1 : string ASSIGN entityelem1"""
-    p[3].set_alias(p[1])
-    p[0] = p[3]
+    p[0] = Update(p[3], 'set_alias', p[1])
 
 def p_outer(p):
     """outer : LEFT 
@@ -241,16 +232,15 @@ def p_outer(p):
     
 def p_outer_columnselem(p):
     """columnselem : outer '(' snamelist1 ')' """
-    p[0] = ast.data.path.ColumnsElem(p[3])
-    p[0].set_outer_type(p[1])
+    p[0] = Update(Call(ast.data.path.ColumnsElem, p[3]), 'set_outer_type', p[1])
 
 def p_columnselem(p):
     """columnselem : '(' snamelist1 ')' """
-    p[0] = ast.data.path.ColumnsElem(p[2])
+    p[0] = Call(ast.data.path.ColumnsElem, p[2])
 
 def p_linkelem(p):
     """linkelem : columnselem '=' '(' snamelist1 ')' """
-    p[0] = p[1].add_link_rhs(p[4])
+    p[0] = Method(p[1], 'add_link_rhs', p[4])
 
 def p_entityelem_link(p):
     """entityelem : columnselem 
@@ -263,40 +253,39 @@ def p_entityelem2(p):
 
 def p_entityelem2_bind(p):
     """entityelem2 : string ASSIGN entityelem"""
-    p[3].set_alias(p[1])
-    p[0] = p[3]
+    p[0] = Update(p[3], 'set_alias', p[1])
 
 def p_entityelem2_filter(p):
     """entityelem2 : filter"""
-    p[0] = ast.data.path.FilterElem(p[1]) 
+    p[0] = Call(ast.data.path.FilterElem, p[1])
 
 def p_entityelem2_context(p):
     """entityelem2 : '$' sname"""
-    p[0] = ast.data.path.ContextResetElem(p[2])
+    p[0] = Call(ast.data.path.ContextResetElem, p[2])
     
 def p_bname(p):
     """bname : string"""
-    p[0] = ast.Name().with_suffix(p[1])
+    p[0] = NameNode().with_suffix(p[1])
 
 def p_sortitem(p):
     """sortitem : string"""
-    p[0] = ast.Sortkey(p[1])
+    p[0] = Call(ast.Sortkey, p[1])
 
 def p_sortitem_descending(p):
     """sortitem : string OPMARK DESC OPMARK"""
-    p[0] = ast.Sortkey(p[1], True)
+    p[0] = Call(ast.Sortkey, p[1], True)
 
 def p_pageitem(p):
     """pageitem : string"""
-    p[0] = predicate.Value(p[1])
+    p[0] = Call(predicate.Value, p[1])
 
 def p_pageitem_null(p):
     """pageitem : OPMARK NULL OPMARK"""
-    p[0] = predicate.Value(None)
+    p[0] = Call(predicate.Value, None)
 
 def p_pageitem_empty(p):
     """pageitem : """
-    p[0] = predicate.Value('')
+    p[0] = Call(predicate.Value, '')
 
 def p_bname_grow(p):
     """bname : bname ':' string"""
@@ -313,21 +302,19 @@ def p_sname(p):
 
 def p_leafattrlist1(p):
     """leafattrlist1 : leafattritem"""
-    p[0] = ast.NameList([ p[1] ])
+    p[0] = List([ p[1] ], ast.NameList)
 
 def p_leafattrlist1_grow(p):
     """leafattrlist1 : leafattrlist1 ',' leafattritem"""
-    p[0] = p[1]
-    p[0].append( p[3] )
+    p[0] = p[1].extended( p[3] )
 
 def p_attrlist1(p):
     """attrlist1 : attritem"""
-    p[0] = ast.NameList([ p[1] ])
+    p[0] = List([ p[1] ], ast.NameList)
 
 def p_attrlist1_grow(p):
     """attrlist1 : attrlist1 ',' attritem"""
-    p[0] = p[1]
-    p[0].append( p[3] )
+    p[0] = p[1].extended( p[3] )
 
 def p_attrcore(p):
     """attrcore : sname
@@ -337,7 +324,7 @@ def p_attrcore(p):
 
 def p_attrcore_agg(p):
     """aggfunc : string '(' sname ')'"""
-    p[0] = ast.Aggregate(p[1], p[3])
+    p[0] = Call(ast.Aggregate, p[1], p[3])
 
 # TODO: uncomment if we implement automatic binning modes
 
@@ -351,7 +338,7 @@ def p_attrcore_agg(p):
 
 def p_binfunc_3(p):
     """binfunc : BIN '(' sname ';' expr ';' expr ';' expr ')'"""
-    p[0] = ast.Binning(p[3], nbins=p[5], minv=p[7], maxv=p[9])
+    p[0] = Call(ast.Binning, p[3], p[5], p[7], p[9])
 
 def p_leafattritem(p):
     """leafattritem : attrcore"""
@@ -359,7 +346,7 @@ def p_leafattritem(p):
 
 def p_leafattritem_aliased(p):
     """leafattritem : string ASSIGN attrcore"""
-    p[0] = p[3].set_alias(p[1])
+    p[0] = Method(p[3], 'set_alias', p[1])
 
 def p_attritem(p):
     """attritem : sname
@@ -369,11 +356,11 @@ def p_attritem(p):
 def p_attritem_aliased(p):
     """attritem : string ASSIGN sname
                 | string ASSIGN binfunc"""
-    p[0] = p[3].set_alias(p[1])
+    p[0] = Method(p[3], 'set_alias', p[1])
 
 def p_snamelist1(p):
     """snamelist1 : sname """
-    p[0] = ast.NameList([ p[1] ])
+    p[0] = List([ p[1] ], ast.NameList)
 
 def p_namelist(p):
     """snamelist1 : snamelist2 """
@@ -381,12 +368,11 @@ def p_namelist(p):
 
 def p_namelist2(p):
     """snamelist2 : sname ',' sname"""
-    p[0] = ast.NameList([ p[1], p[3] ])
+    p[0] = List([ p[1], p[3] ], ast.NameList)
 
 def p_namelist2_grow(p):
     """snamelist2 : snamelist2 ',' sname"""
-    p[0] = p[1]
-    p[0].append( p[3] )
+    p[0] = p[1].extended( p[3] )
 
 #def p_refop(p):
 #    """refop : REFL2R
@@ -401,11 +387,11 @@ def p_filter(p):
 
 def p_predicate2(p):
     """predicate : sname op expr """
-    p[0] = predicate.predicatecls(p[2])(p[1], p[3])
+    p[0] = Call(predicate.predicatecls(p[2]), p[1], p[3])
 
 def p_predicate1(p):
     """predicate : sname opnull """
-    p[0] = predicate.predicatecls(p[2])(p[1])
+    p[0] = Call(predicate.predicatecls(p[2]), p[1])
 
 def p_neg_predicate1(p):
     """npredicate : predicate """
@@ -413,7 +399,7 @@ def p_neg_predicate1(p):
 
 def p_neg_predicate2(p):
     """npredicate : '!' predicate """
-    p[0] = predicate.Negation( p[2] )
+    p[0] = Call(predicate.Negation, p[2])
 
 def p_paren_predicate(p):
     """predicate : '(' filter ')' """
@@ -421,25 +407,23 @@ def p_paren_predicate(p):
 
 def p_conjunction_base(p):
     """conjunction : npredicate """
-    p[0] = predicate.Conjunction([p[1]])
+    p[0] = List([p[1]], predicate.Conjunction)
 
 def p_conjunction_grow(p):
     """conjunction : conjunction '&' npredicate"""
-    p[0] = p[1]
-    p[0].append( p[3] )
+    p[0] = p[1].extended( p[3] )
 
 def p_disjunction_base(p):
     """disjunction : conjunction ';' conjunction"""
-    p[0] = predicate.Disjunction([p[1], p[3]])
+    p[0] = List([p[1], p[3]], predicate.Disjunction)
 
 def p_disjunction_grow(p):
     """disjunction : disjunction ';' conjunction"""
-    p[0] = p[1]
-    p[0].append( p[3] )
+    p[0] = p[1].extended( p[3] )
 
 def p_expr_const(p):
     """expr : string """
-    p[0] = predicate.Value(p[1])
+    p[0] = Call(predicate.Value, p[1])
 
 def p_expr_name(p):
     """expr : name """
@@ -447,7 +431,7 @@ def p_expr_name(p):
 
 def p_expr_empty(p):
     """expr : """
-    p[0] = predicate.Value('')
+    p[0] = Call(predicate.Value, '')
     
 def p_op(p):
     """op : '='"""
@@ -473,11 +457,11 @@ def p_oplabel(p):
 
 def p_schemas(p):
     """schemas : catalogslash SCHEMA slashopt """
-    p[0] = p[1].schemas()
+    p[0] = Method(p[1], 'schemas')
 
 def p_schema(p):
     """schema : catalogslash SCHEMA '/' sname """
-    p[0] = p[1].schema(p[4])
+    p[0] = Method(p[1], 'schema', p[4])
 
 def p_schema2(p):
     """schemaslash : schema '/'"""
@@ -494,7 +478,7 @@ def p_commentable(p):
 
 def p_comment(p):
     """comment : commentable COMMENT"""
-    p[0] = p[1].comment()
+    p[0] = Method(p[1], 'comment')
 
 def p_aclable(p):
     """aclable : catalogslash
@@ -506,7 +490,7 @@ def p_aclable(p):
 
 def p_acls(p):
     """acls : aclable ACL"""
-    p[0] = p[1].acls()
+    p[0] = Method(p[1], 'acls')
 
 def p_aclsslash(p):
     """aclsslash : acls '/' """
@@ -514,7 +498,7 @@ def p_aclsslash(p):
 
 def p_acl(p):
     """acl : aclsslash string"""
-    p[0] = p[1].acl(p[2])
+    p[0] = Method(p[1], 'acl', p[2])
 
 def p_dynaclable(p):
     """dynaclable : tableslash
@@ -524,7 +508,7 @@ def p_dynaclable(p):
 
 def p_dynacls(p):
     """dynacls : dynaclable ACL_BINDING"""
-    p[0] = p[1].dynacls()
+    p[0] = Method(p[1], 'dynacls')
 
 def p_dynaclsslash(p):
     """dynaclsslash : dynacls '/' """
@@ -532,7 +516,7 @@ def p_dynaclsslash(p):
 
 def p_dynacl(p):
     """dynacl : dynaclsslash string"""
-    p[0] = p[1].dynacl(p[2])
+    p[0] = Method(p[1], 'dynacl', p[2])
 
 def p_annotatable(p):
     """annotatable : catalogslash
@@ -546,7 +530,7 @@ def p_annotatable(p):
 
 def p_annotations(p):
     """annotations : annotatable ANNOTATION"""
-    p[0] = p[1].annotations()
+    p[0] = Method(p[1], 'annotations')
 
 def p_annotationsslash(p):
     """annotationsslash : annotations '/' """
@@ -554,11 +538,11 @@ def p_annotationsslash(p):
 
 def p_annotation(p):
     """annotation : annotationsslash string"""
-    p[0] = p[1].annotation(p[2])
+    p[0] = Method(p[1], 'annotation', p[2])
     
 def p_tables(p):
     """tables : schemaslash TABLE"""
-    p[0] = p[1].tables()
+    p[0] = Method(p[1], 'tables')
 
 def p_tables2(p):
     """tablesslash : tables '/'"""
@@ -568,7 +552,7 @@ def p_table(p):
     """table : tablesslash sname """
     if len(p[2]) > 1:
         raise ParseError(p[2], 'Qualified table name not allowed: ')
-    p[0] = p[1].table(p[2])
+    p[0] = Method(p[1], 'table', p[2])
 
 def p_table2(p):
     """tableslash : table '/' """
@@ -576,7 +560,7 @@ def p_table2(p):
 
 def p_columns(p):
     """columns : tableslash COLUMN """
-    p[0] = p[1].columns()
+    p[0] = Method(p[1], 'columns')
 
 def p_columns2(p):
     """columnsslash : columns '/' """
@@ -586,7 +570,7 @@ def p_column(p):
     """column : columnsslash sname """
     if len(p[2]) > 1:
         raise ParseError(p[2], 'Qualified column name not allowed: ')
-    p[0] = p[1].column(p[2])
+    p[0] = Method(p[1], 'column', p[2])
 
 def p_columnslash(p):
     """columnslash : column '/'"""
@@ -594,14 +578,14 @@ def p_columnslash(p):
 
 def p_keys(p):
     """keys : tableslash KEY slashopt """
-    p[0] = p[1].keys()
+    p[0] = Method(p[1], 'keys')
 
 def p_key(p):
     """key : tableslash KEY '/' snamelist1 """
     for name in p[4]:
         if len(name) > 1:
             raise ParseError(name, 'Qualified key column name not allowed: ')
-    p[0] = p[1].key(p[4])
+    p[0] = Method(p[1], 'key', p[4])
 
 def p_keyslash(p):
     """keyslash : key '/' """
@@ -609,23 +593,23 @@ def p_keyslash(p):
 
 def p_foreignkeys(p):
     """foreignkeys : tableslash FOREIGNKEY slashopt """
-    p[0] = p[1].foreignkeys()
+    p[0] = Method(p[1], 'foreignkeys')
 
 def p_foreignkey(p):
     """foreignkey : tableslash FOREIGNKEY '/' snamelist1 """
     for name in p[4]:
         if len(name) > 1:
             raise ParseError(name, 'Qualified foreign key column name not allowed: ')
-    p[0] = p[1].foreignkey(p[4])
+    p[0] = Method(p[1], 'foreignkey', p[4])
 
 
 def p_foreignkey_reference(p):
     """foreignkeyrefs : foreignkey '/' REFERENCE slashopt """
-    p[0] = p[1].references()
+    p[0] = Method(p[1], 'references')
 
 def p_foreignkey_reftable(p):
     """foreignkeyreftable : foreignkey '/' REFERENCE '/' sname """
-    p[0] = p[1].references().with_to_table_name(p[5])
+    p[0] = Method(Method(p[1], 'references'), 'with_to_table_name', p[5])
 
 def p_foreignkey_reftable2(p):
     """foreignkeyreftableslash : foreignkeyreftable '/'"""
@@ -636,7 +620,7 @@ def p_foreignkey_reftable_columns(p):
     for name in p[2]:
         if len(name) > 1:
             raise ParseError(name, 'Qualified key column name not allowed: ')
-    p[0] = p[1].with_to_columns(p[2])
+    p[0] = Method(p[1], 'with_to_columns', p[2])
 
 def p_foreignkeyrefslash(p):
     """foreignkeyrefslash : foreignkeyref '/'"""
@@ -649,7 +633,7 @@ def p_queryopts(p):
 
 def p_queryopts_empty(p):
     """queryopts_empty : """
-    p[0] = web.storage()
+    p[0] = Call(make_queryopts)
 
 def queryopts_add(q, k, v=None):
     """Add value to queryopts by key, handling special cases.
@@ -684,11 +668,16 @@ def queryopts_add(q, k, v=None):
     else:
         q[k] = v
 
+def make_queryopts(*elems):
+    """Return queryopts storage built from (k, v) elements in order."""
+    q = web.storage()
+    for k, v in elems:
+        queryopts_add(q, k, set(v) if type(v) is frozenset else v)
+    return q
+
 def p_queryopts_nonempty(p):
     """queryopts_nonempty : '?' queryopts_elem"""
-    p[0] = web.storage()
-    k, v = p[2]
-    queryopts_add(p[0], k, v)
+    p[0] = Call(make_queryopts, p[2])
 
 def p_queryopts_elem(p):
     """queryopts_elem : string '=' string
@@ -703,18 +692,15 @@ def p_queryopts_elem_short(p):
 def p_queryopts_grow(p):
     """queryopts_nonempty : queryopts_nonempty '&' queryopts_elem
                           | queryopts_nonempty ';' queryopts_elem"""
-    p[0] = p[1]
-    k, v = p[3]
-    queryopts_add(p[0], k, v)
+    p[0] = Call(make_queryopts, *(p[1].args + (p[3],)))
 
 def p_stringset(p):
     """stringset : string ',' string"""
-    p[0] = set([p[1], p[3]])
+    p[0] = frozenset([p[1], p[3]])
 
 def p_stringset_grow(p):
     """stringset : stringset ',' string"""
-    p[0] = p[1]
-    p[1].add(p[3])
+    p[0] = p[1].union([p[3]])
 
 def p_spacestring(p):
     """spacestring : '+'"""
@@ -748,30 +734,143 @@ def p_error(t):
 ################################################
 # provide wrappers to get a parser instance
 
+# parser tables generated at build time, see write_tables()
+tabmodule = 'ermrest.url.url_parsetab'
+
 def make_parser():
     # use this to shut it up: errorlog=yacc.NullLogger()
     # NullLogger attribute not supported by Python 2.4
     # return yacc.yacc(debug=False, errorlog=yacc.NullLogger())
-    return yacc.yacc(debug=False, optimize=1, tabmodule='url_parsetab', write_tables=0)
+    # without optimize, ply only uses tables matching the grammar signature
+    # and otherwise builds them in memory
+    return yacc.yacc(debug=False, optimize=0, tabmodule=tabmodule, write_tables=0)
     #return yacc.yacc()
 
+def write_tables(outputdir):
+    """Write parser tables module into outputdir."""
+    yacc.yacc(debug=False, optimize=0, tabmodule=tabmodule, write_tables=1, outputdir=outputdir)
+
 def make_parse():
-    lock = threading.Lock()
-    lock.acquire()
-    try:
-        parser = make_parser()
-        lexer = make_lexer()
-    finally:
-        lock.release()
-        
+    parser = make_parser()
+    lexer = make_lexer()
+    local = threading.local()
+
     def parse(s):
-        lock.acquire()
         try:
-            return parser.parse(s, lexer=lexer)
-        finally:
-            lock.release()
+            tparser, tlexer = local.parser, local.lexer
+        except AttributeError:
+            # each thread gets its own parse state sharing the read-only tables
+            tparser, tlexer = copy.copy(parser), lexer.clone()
+            local.parser, local.lexer = tparser, tlexer
+        return tparser.parse(s, lexer=tlexer)
     return parse
 
-# provide a mutexed parser instance for all to use
-url_parse_func = make_parse()
+class ParseCache (object):
+    """A bounded, thread-safe LRU cache of URL parse results.
+
+       Entries map URL text to its IR, which is never mutated and
+       may be bound by any number of requests.  Least recently used
+       entries are evicted when max_entries is exceeded.  URLs longer
+       than max_url_length are never cached, so the memory held by the
+       cache is bounded by both limits.
+
+    """
+    def __init__(self, config=None):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # url -> IR
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.skips = 0
+        self.configure(config)
+
+    def configure(self, config=None):
+        """Apply url_parse_cache config settings."""
+        if config is None:
+            config = dict()
+        self.enabled = config.get('enabled', True)
+        self.max_entries = config.get('max_entries', 4096)
+        self.max_url_length = config.get('max_url_length', 2048)
+        self._lock.acquire()
+        try:
+            self._evict()
+        finally:
+            self._lock.release()
+
+    def get(self, url):
+        """Return cached IR for url or None."""
+        if not self._cacheable(url):
+            self.skips += 1
+            return None
+        self._lock.acquire()
+        try:
+            result = self._entries.pop(url, None)
+            if result is None:
+                self.misses += 1
+                return None
+            # re-insert as most recently used
+            self._entries[url] = result
+            self.hits += 1
+            return result
+        finally:
+            self._lock.release()
+
+    def put(self, url, result):
+        """Cache IR result for url."""
+        if not self.enabled or not self._cacheable(url):
+            return
+        self._lock.acquire()
+        try:
+            self._entries[url] = result
+            self._evict()
+        finally:
+            self._lock.release()
+
+    def _cacheable(self, url):
+        return self.max_url_length is None or len(url) <= self.max_url_length
+
+    def _evict(self):
+        """Evict least recently used entries to fit budget.  Caller must hold self._lock."""
+        if self.max_entries is None:
+            return
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._entries.clear()
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        """Return a dictionary of cache statistics."""
+        self._lock.acquire()
+        try:
+            return dict(
+                entries=len(self._entries),
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                skips=self.skips,
+            )
+        finally:
+            self._lock.release()
+
+# provide a thread-safe parser instance for all to use
+_parse = make_parse()
+url_parse_cache = ParseCache()
+
+def url_parse_ir(s):
+    """Return the IR for URL text s, parsing it only if not cached."""
+    result = url_parse_cache.get(s)
+    if result is None:
+        result = _parse(s)
+        url_parse_cache.put(s, result)
+    return result
+
+def url_parse_func(s):
+    """Parse URL text s and bind it to a fresh AST for the current request."""
+    return bind(url_parse_ir(s))
 
@@ -0,0 +1,327 @@
+
+# 
+# Copyright 2013 University of Southern California
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#    http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Push-based tracking of catalog model versions.
+
+Each catalog's _ermrest.model_change_event() function sends a
+pg_notify() when it records a change.  A VersionTracker keeps one
+LISTENing connection per recently used catalog database and maintains
+the current model versions in memory, so requests can skip the model
+version query entirely.
+
+Versions are only reported while the tracker is listening and has
+recently serviced notifications, or while a configured polling
+fallback is fresh.  A caller receiving None must
+query the database as before.  A notification arrives moments after
+its transaction commits, so a request starting within that window may
+still see the previous version.
+
+"""
+
+import time
+import select
+import threading
+import os
+import psycopg2
+import psycopg2.extensions
+import web
+
+__all__ = ['tracker']
+
+MODEL_CHANNEL = 'ermrest_model'
+
+# new catalogs get this definition, existing ones via sbin/ermrest-deploy
+MODEL_CHANGE_EVENT_FUNCTION = """
+CREATE OR REPLACE FUNCTION _ermrest.model_change_event() RETURNS void AS $$
+DECLARE
+
+  resultbool boolean;
+  trigger_txid bigint;
+
+BEGIN
+
+  SELECT txid_current() INTO trigger_txid;
+
+  SELECT EXISTS (SELECT snap_txid
+                 FROM _ermrest.model_version
+                 WHERE snap_txid = trigger_txid)
+  INTO resultbool ;
+
+  IF NOT resultbool THEN
+
+    INSERT INTO _ermrest.model_version (snap_txid)
+      SELECT trigger_txid ;
+
+    PERFORM pg_notify('ermrest_model', trigger_txid::text);
+
+  END IF;
+
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# true if this catalog's model change event function sends notifications
+NOTIFY_SUPPORTED = """
+SELECT count(*) = 1
+FROM pg_catalog.pg_proc p
+JOIN pg_catalog.pg_namespace n ON (p.pronamespace = n.oid)
+WHERE n.nspname = '_ermrest'
+  AND p.proname = 'model_change_event'
+  AND p.prosrc ~ 'pg_notify';
+"""
+
+MODEL_VERSION = """
+SELECT max(snap_txid) AS txid FROM _ermrest.model_version WHERE snap_txid < txid_snapshot_xmin(txid_current_snapshot()) ;
+"""
+
+class CatalogVersions (object):
+    """Tracked versions of one catalog database."""
+    def __init__(self, dsn):
+        self.dsn = dsn
+        self.conn = None
+        self.listening = False
+        self.serviced = None # time the tracker last serviced notifications when listening
+        self.polled = None # time of last poll when not listening
+        self.retry_after = 0
+        self.last_used = time.time()
+        self.model_version = None
+        self.model_pending = None # newest notified model txid
+
+    def close(self):
+        self.listening = False
+        self.serviced = None
+        self.polled = None
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except:
+                pass
+            self.conn = None
+
+class VersionTracker (object):
+    """Track model versions of recently used catalogs in the background.
+
+       All catalog connections are serviced by one daemon thread,
+       started lazily in each process.
+    """
+
+    # seconds between housekeeping passes of the tracker thread
+    TICK = 1
+
+    # seconds before retrying a catalog whose tracking failed
+    RETRY_INTERVAL = 60
+
+    # seconds after which versions are not trusted unless notifications were serviced
+    MAX_SERVICE_AGE = 5
+
+    # libpq connection settings so an unreachable catalog or a silently
+    # dead LISTEN socket cannot stall tracking indefinitely
+    CONNECT_OPTIONS = 'connect_timeout=5 keepalives=1 keepalives_idle=30 keepalives_interval=10 keepalives_count=3'
+
+    def __init__(self, config=None):
+        self._lock = threading.Lock()
+        self.catalogs = dict() # dsn -> CatalogVersions
+        self._thread = None
+        self._thread_pid = None
+        self.configure(config)
+
+    def configure(self, config=None):
+        """Apply version_tracking config settings."""
+        if config is None:
+            config = dict()
+        self.enabled = config.get('enabled', True)
+        self.max_catalogs = config.get('max_catalogs', 16)
+        self.max_idle_seconds = config.get('max_idle_seconds', 300)
+        self.poll_interval = config.get('poll_interval', 0)
+
+    def _trusted(self, entry):
+        """Return True if entry versions are current.  Caller must hold self._lock."""
+        if entry.listening:
+            # the tracker thread may be blocked on another catalog
+            return entry.serviced is not None and entry.serviced + self.MAX_SERVICE_AGE > time.time()
+        return entry.polled is not None and entry.polled + self.poll_interval > time.time()
+
+    def _entry(self, dsn):
+        """Return trusted entry for dsn or None, tracking dsn from now on."""
+        if not self.enabled:
+            return None
+        self._lock.acquire()
+        try:
+            self._start_thread()
+            entry = self.catalogs.get(dsn)
+            if entry is None:
+                self.catalogs[dsn] = CatalogVersions(dsn)
+                return None
+            entry.last_used = time.time()
+            return entry if self._trusted(entry) else None
+        finally:
+            self._lock.release()
+
+    def model_version(self, dsn):
+        """Return current model version of catalog dsn, or None if unknown."""
+        entry = self._entry(dsn)
+        if entry is None:
+            return None
+        self._lock.acquire()
+        try:
+            if entry.model_pending is not None and entry.model_pending > entry.model_version:
+                # notified change not yet visible as a model version
+                return None
+            return entry.model_version
+        finally:
+            self._lock.release()
+
+    def model_changed(self, dsn, version):
+        """Hold back tracked model versions of dsn until version is seen."""
+        self._lock.acquire()
+        try:
+            entry = self.catalogs.get(dsn)
+            if entry is not None:
+                entry.model_pending = max(entry.model_pending, version)
+        finally:
+            self._lock.release()
+
+    def _start_thread(self):
+        """Start tracker thread if needed.  Caller must hold self._lock."""
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, name='ermrest-version-tracker')
+        self._thread.daemon = True
+        self._thread_pid = os.getpid()
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                self._tick()
+            except Exception, e:
+                web.debug(u'got exception "%s" in version tracker' % unicode(e))
+                time.sleep(self.TICK)
+
+    def _tick(self):
+        """Maintain connections, wait for notifications, and refresh versions."""
+        now = time.time()
+        self._lock.acquire()
+        try:
+            entries = sorted(self.catalogs.values(), key=lambda e: e.last_used, reverse=True)
+            for i, entry in enumerate(entries):
+                if i >= self.max_catalogs or entry.last_used + self.max_idle_seconds < now:
+                    entry.close()
+                    del self.catalogs[entry.dsn]
+            entries = entries[0:self.max_catalogs]
+        finally:
+            self._lock.release()
+
+        for entry in entries:
+            if entry.dsn not in self.catalogs:
+                continue
+            try:
+                if entry.conn is None and entry.retry_after <= now:
+                    self._connect(entry)
+                elif entry.conn is not None and not entry.listening \
+                     and entry.polled is not None and entry.polled + self.poll_interval <= now:
+                    self._refresh_model(entry, time.time())
+                elif entry.listening and entry.model_pending > entry.model_version:
+                    self._refresh_model(entry)
+            except psycopg2.Error, e:
+                web.debug(u'version tracking failed for catalog "%s": %s' % (entry.dsn, unicode(e)))
+                self._fail(entry)
+
+        listening = [ entry for entry in entries if entry.listening ]
+        if not listening:
+            time.sleep(self.TICK)
+            return
+
+        readable, w, x = select.select([ entry.conn for entry in listening ], [], [], self.TICK)
+        for entry in listening:
+            if entry.conn not in readable:
+                continue
+            try:
+                self._receive(entry)
+            except psycopg2.Error, e:
+                web.debug(u'version tracking failed for catalog "%s": %s' % (entry.dsn, unicode(e)))
+                self._fail(entry)
+
+        now = time.time()
+        self._lock.acquire()
+        try:
+            for entry in listening:
+                if entry.listening:
+                    entry.serviced = now
+        finally:
+            self._lock.release()
+
+    def _fail(self, entry):
+        self._lock.acquire()
+        try:
+            entry.close()
+            entry.retry_after = time.time() + self.RETRY_INTERVAL
+        finally:
+            self._lock.release()
+
+    def _connect(self, entry):
+        """Open entry's connection and start listening or polling."""
+        conn = psycopg2.connect('%s %s' % (entry.dsn, self.CONNECT_OPTIONS))
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        entry.conn = conn
+        cur = conn.cursor()
+        cur.execute(NOTIFY_SUPPORTED)
+        if cur.fetchone()[0]:
+            cur.execute("LISTEN %s;" % MODEL_CHANNEL)
+            # versions read after LISTEN cannot miss a change
+            self._refresh_model(entry)
+            self._lock.acquire()
+            entry.listening = True
+            entry.serviced = time.time()
+            self._lock.release()
+        elif self.poll_interval > 0:
+            self._refresh_model(entry, time.time())
+        else:
+            # catalog not upgraded yet, check again later
+            self._fail(entry)
+
+    def _refresh_model(self, entry, polled=None):
+        """Query model version of entry's catalog."""
+        cur = entry.conn.cursor()
+        cur.execute(MODEL_VERSION)
+        model_version = cur.fetchone()[0]
+        cur.close()
+        self._lock.acquire()
+        try:
+            entry.model_version = model_version
+            if polled is not None:
+                entry.polled = polled
+        finally:
+            self._lock.release()
+
+    def _receive(self, entry):
+        """Apply notifications pending on entry's connection."""
+        entry.conn.poll()
+        model_changed = False
+        while entry.conn.notifies:
+            notify = entry.conn.notifies.pop(0)
+            if notify.channel == MODEL_CHANNEL:
+                txid = int(notify.payload)
+                self._lock.acquire()
+                try:
+                    entry.model_pending = max(entry.model_pending, txid)
+                finally:
+                    self._lock.release()
+                model_changed = True
+        if model_changed:
+            self._refresh_model(entry)
+
+tracker = VersionTracker()
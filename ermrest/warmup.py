@@ -0,0 +1,157 @@
+
+# 
+# Copyright 2012-2017 University of Southern California
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#    http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Warm the model cache when a service process starts.
+
+A fresh process would otherwise introspect each catalog's model while
+serving the first request to that catalog.  The ModelWarmer loads the
+current model of every registered catalog into the model cache ahead
+of time and reports its progress so health checks can wait for it.
+
+"""
+
+import time
+import threading
+import Queue
+import web
+
+from . import sanepg2
+from .catalog import Catalog, model_cache
+
+__all__ = ['warmer']
+
+class ModelWarmer (object):
+    """Load current models of registered catalogs into the model cache."""
+
+    def __init__(self, config=None):
+        self._lock = threading.Lock()
+        self.state = 'idle'
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.started = None
+        self.finished = None
+        self.configure(config)
+
+    def configure(self, config=None):
+        """Apply model_warmup config settings."""
+        if config is None:
+            config = dict()
+        self.enabled = config.get('enabled', False)
+        self.concurrency = max(1, config.get('concurrency', 2))
+        self.background = config.get('background', True)
+        # by default, warm no more catalogs than the cache can hold
+        self.max_catalogs = config.get('max_catalogs')
+
+    def ready(self):
+        """Return True unless warm-up is still pending or running."""
+        return self.state in ('disabled', 'ready')
+
+    def status(self):
+        """Return a dictionary describing warm-up progress."""
+        self._lock.acquire()
+        try:
+            return dict(
+                ready=self.ready(),
+                state=self.state,
+                catalogs=self.total,
+                warmed=self.done,
+                failed=self.failed,
+                started=self.started,
+                finished=self.finished,
+            )
+        finally:
+            self._lock.release()
+
+    def start(self, registry, factory, config):
+        """Start warming models of catalogs in registry, in the background if configured."""
+        if not self.enabled or registry is None or factory is None:
+            self.state = 'disabled'
+            return
+        self.state = 'warming'
+        self.started = time.time()
+        if self.background:
+            thread = threading.Thread(target=self.run, args=(registry, factory, config), name='ermrest-model-warmup')
+            thread.daemon = True
+            thread.start()
+        else:
+            self.run(registry, factory, config)
+
+    def run(self, registry, factory, config):
+        """Warm models of all catalogs in registry with bounded concurrency."""
+        try:
+            web.ctx.ermrest_config = config
+            entries = registry.lookup()
+            limit = self.max_catalogs if self.max_catalogs is not None else model_cache.max_entries
+            if limit is not None:
+                entries = entries[0:limit]
+            queue = Queue.Queue()
+            for entry in entries:
+                queue.put(entry)
+            self._lock.acquire()
+            self.total = len(entries)
+            self._lock.release()
+
+            workers = [
+                threading.Thread(target=self._worker, args=(queue, factory, config), name='ermrest-model-warmup-%d' % i)
+                for i in range(min(self.concurrency, len(entries)))
+            ]
+            for worker in workers:
+                worker.daemon = True
+                worker.start()
+            for worker in workers:
+                worker.join()
+        except Exception, e:
+            # a failed warm-up must not keep the service from becoming ready
+            web.debug(u'model warm-up aborted: %s' % unicode(e))
+        self._lock.acquire()
+        self.state = 'ready'
+        self.finished = time.time()
+        self._lock.release()
+        web.debug(u'model warm-up finished: %(warmed)d of %(catalogs)d catalogs, %(failed)d failed' % self.status())
+
+    def _worker(self, queue, factory, config):
+        # web.ctx is thread-local and introspection consults this state
+        web.ctx.ermrest_config = config
+        web.ctx.ermrest_model_rights_cache = dict()
+        while True:
+            try:
+                entry = queue.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                self._warm(entry, factory, config)
+                succeeded = True
+            except Exception, e:
+                web.debug(u'model warm-up failed for catalog %s: %s' % (entry['id'], unicode(e)))
+                succeeded = False
+            self._lock.acquire()
+            if succeeded:
+                self.done += 1
+            else:
+                self.failed += 1
+            self._lock.release()
+
+    def _warm(self, entry, factory, config):
+        manager = Catalog(factory, entry['descriptor'], config)
+        pc = sanepg2.PooledConnection(manager.dsn, key=entry['id'])
+        try:
+            pc.perform(lambda conn, cur: manager.get_model(cur)).next()
+        finally:
+            pc.final()
+
+warmer = ModelWarmer()
@@ -87,6 +87,49 @@ class AnnotationKey (AnnotationCatalog):
 class AnnotationFKey (AnnotationCatalog):
     uri = 'schema/%s/table/%s/foreignkey/level1_id1/reference/%s:%s/id/annotation' % (_S, _T2b, _S, _T1)
 
+class AnnotationIsolation (common.ErmrestTest):
+    # model objects share names, types and empty containers, so a change
+    # to one resource must not show up on its look-alike siblings
+    tag = 'tag:misd.isi.edu,2015:isolation'
+    target = 'schema/%s/table/%s/column/name' % (_S, _T1)
+    siblings = [
+        'schema/%s/table/%s/column/id' % (_S, _T1),
+        'schema/%s/table/%s/column/name' % (_S, _T2b),
+        'schema/%s/table/%s' % (_S, _T1),
+        'schema/%s/table/%s/key/id' % (_S, _T1),
+    ]
+
+    def _get(self, uri):
+        r = self.session.get(uri)
+        self.assertHttp(r, 200, 'application/json')
+        return r.json()
+
+    def _check_isolated(self, suffix, change, restore):
+        before = [ self._get('%s/%s' % (uri, suffix)) for uri in self.siblings ]
+        change()
+        try:
+            for uri, state in zip(self.siblings, before):
+                self.assertEqual(self._get('%s/%s' % (uri, suffix)), state, uri)
+        finally:
+            restore()
+
+    def test_annotation(self):
+        url = '%s/annotation/%s' % (self.target, common.urlquote(self.tag))
+        self._check_isolated(
+            'annotation',
+            lambda : self.assertHttp(self.session.put(url, json='isolated'), [201, 204]),
+            lambda : self.assertHttp(self.session.delete(url), 204)
+        )
+        self.assertHttp(self.session.get(url), 404)
+
+    def test_acl(self):
+        url = '%s/acl/select' % self.target
+        self._check_isolated(
+            'acl',
+            lambda : self.assertHttp(self.session.put(url, json=[common.primary_client_id]), 200),
+            lambda : self.assertHttp(self.session.delete(url), 200)
+        )
+        self.assertEqual(self._get('%s/acl' % self.target)['select'], None)
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)
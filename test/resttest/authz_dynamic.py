@@ -186,6 +186,14 @@ def make_delete_test(session, data, get_url, get_expect):
         get_expect(self, session, data).check(self, test_session.delete(get_url(self, test_data)))
     return test
 
+def _reset_data():
+    rdata = list(_data)
+    rdata.reverse()
+    for path, data in rdata:
+        common.primary_session.delete(path)
+    for path, data in _data:
+        common.primary_session.put(path, data=data, headers={"Content-Type": "text/csv"}).raise_for_status()
+
 def _test_data_id_preds(test_data):
     return ';'.join([ "id=%d" % row['id'] for row in test_data ])
 
@@ -342,12 +350,7 @@ class StaticHidden (common.ErmrestTest):
 
     def setUp(self):
         # reset data in case we have mutation test cases
-        rdata = list(_data)
-        rdata.reverse()
-        for path, data in rdata:
-            common.primary_session.delete(path)
-        for path, data in _data:
-            common.primary_session.put(path, data=data, headers={"Content-Type": "text/csv"}).raise_for_status()
+        _reset_data()
 
     test_expectations = {
         'primary_get_data': Expectation(200, 'application/json', {
@@ -892,6 +895,56 @@ class CategoriesAclOwnerHiddenPolicy (HiddenPolicy):
         }
     )
 
+class SqlShapeRoles (common.ErmrestTest):
+    # Hack: this class borrows the RowMemberOwner policy but not its tests
+    acls = RowMemberOwner.acls
+    col_acls = RowMemberOwner.col_acls
+    fkr_acls = RowMemberOwner.fkr_acls
+    bindings = RowMemberOwner.bindings
+    col_bindings = RowMemberOwner.col_bindings
+    fkr_bindings = RowMemberOwner.fkr_bindings
+
+    # Data rows visible to each session under the member bindings
+    visible = {
+        'primary': [11,12,13,14,21,22,23,24,31,32,33,34,41,42,43,44],
+        'secondary': [11,12,13,14,31,32,33,34],
+        'anonymous': [11,12,13,14],
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        StaticHidden._setUpClass(cls)
+        _reset_data()
+
+    def _check_shapes(self, get_path, get_expected):
+        # same URL shape for every role, interleaved so cached SQL gets reused
+        for repeat in range(2):
+            for param in range(1, 5):
+                for session in ['primary', 'secondary', 'anonymous']:
+                    test_session = getattr(common, '%s_session' % session)
+                    if test_session is None:
+                        continue
+                    path = get_path(param)
+                    r = test_session.get(path)
+                    self.assertHttp(r, 200, 'application/json')
+                    self.assertEqual(
+                        [ row['id'] for row in r.json() ],
+                        get_expected(self.visible[session], param),
+                        '%s %s' % (session, path)
+                    )
+
+    def test_literals(self):
+        self._check_shapes(
+            lambda c_id: 'entity/%s:Data/c_id=%d@sort(id)' % (_S, c_id),
+            lambda ids, c_id: [ i for i in ids if i % 10 == c_id ]
+        )
+
+    def test_limits(self):
+        self._check_shapes(
+            lambda limit: 'entity/%s:Data@sort(id)?limit=%d' % (_S, limit * 3),
+            lambda ids, limit: ids[0:limit * 3]
+        )
+
 class ImplicitEnumeration (common.ErmrestTest):
     # Hack: this class steals part of StaticHidden but doesn't want all the data-api tests
 
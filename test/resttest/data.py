@@ -1,5 +1,6 @@
 
 import unittest
+import json
 import common
 import basics
 from common import urlquote
@@ -178,6 +179,101 @@ class ForeignKeyComposite (ForeignKey):
         for row in CompositeKey._initial
     ]
 
+class SqlShapes (common.ErmrestTest):
+    # same URL shape with different literals and limits must not share results
+    table = _T1
+    data = [
+        {"id": 101, "name": "shape 1"},
+        {"id": 102, "name": "shape 2"},
+        {"id": 103, "name": "shape 3"},
+        {"id": 104, "name": "shape 4"},
+    ]
+
+    def setUp(self):
+        self.assertHttp(self.session.put('entity/%s:%s' % (_S, self.table), json=self.data), 200)
+
+    def _get_ids(self, path):
+        r = self.session.get('entity/%s:%s/%s' % (_S, self.table, path))
+        self.assertHttp(r, 200, 'application/json')
+        return [ row['id'] for row in r.json() ]
+
+    def test_literals(self):
+        for repeat in range(2):
+            for row in self.data:
+                self.assertEqual(self._get_ids('id=%d' % row['id']), [row['id']])
+                self.assertEqual(self._get_ids('name=%s' % urlquote(row['name'])), [row['id']])
+
+    def test_limits(self):
+        for repeat in range(2):
+            for limit in range(1, 5):
+                self.assertEqual(
+                    self._get_ids('id::gt::100@sort(id)?limit=%d' % limit),
+                    [ row['id'] for row in self.data ][0:limit]
+                )
+
+    def test_page_boundaries(self):
+        for repeat in range(2):
+            for row in self.data:
+                self.assertEqual(
+                    self._get_ids('id::gt::100@sort(id)@after(%d)?limit=2' % row['id']),
+                    [ r['id'] for r in self.data if r['id'] > row['id'] ][0:2]
+                )
+
+class PreparedStatements (common.ErmrestTest):
+    # data GETs run as cached prepared statements which must follow model changes
+    table = 'prepared'
+    tdef = {
+        "table_name": table,
+        "column_definitions": [
+            { "type": { "typename": "int8" }, "name": "id", "nullok": False },
+            { "type": { "typename": "text" }, "name": "name" }
+        ],
+        "keys": [ { "unique_columns": [ "id" ] } ]
+    }
+    data = [
+        {"id": 1, "name": "one"},
+        {"id": 2, "name": "two"},
+        {"id": 3, "name": "three"},
+    ]
+
+    def setUp(self):
+        self.session.delete('schema/%s/table/%s' % (_S, self.table))
+        self.assertHttp(self.session.post('schema/%s/table' % _S, json=self.tdef), 201)
+        self.assertHttp(self.session.post('entity/%s:%s' % (_S, self.table), json=self.data), 200)
+
+    def tearDown(self):
+        self.session.delete('schema/%s/table/%s' % (_S, self.table))
+
+    def _get_rows(self, path='id=1'):
+        r = self.session.get('entity/%s:%s/%s' % (_S, self.table, path))
+        self.assertHttp(r, 200, 'application/json')
+        return r.json()
+
+    def test_column_changes(self):
+        cpath = 'schema/%s/table/%s/column' % (_S, self.table)
+        self.assertEqual(self._get_rows(), [{"id": 1, "name": "one"}])
+        for ctype, value in [("int4", 5), ("text", "five")]:
+            self.assertHttp(self.session.post(cpath, json={"name": "extra", "type": {"typename": ctype}}), 201)
+            self.assertEqual(self._get_rows(), [{"id": 1, "name": "one", "extra": None}])
+            self.assertHttp(self.session.put('attributegroup/%s:%s/id;extra' % (_S, self.table), json=[{"id": 1, "extra": value}]), 200)
+            self.assertEqual(self._get_rows(), [{"id": 1, "name": "one", "extra": value}])
+            self.assertHttp(self.session.delete('%s/extra' % cpath), 204)
+            self.assertEqual(self._get_rows(), [{"id": 1, "name": "one"}])
+
+    def test_content_types(self):
+        for repeat in range(2):
+            for row in self.data:
+                path = 'entity/%s:%s/id=%d' % (_S, self.table, row['id'])
+                r = self.session.get(path, headers={"Accept": "application/json"})
+                self.assertHttp(r, 200, 'application/json')
+                self.assertEqual(r.json(), [row])
+                r = self.session.get(path, headers={"Accept": "application/x-json-stream"})
+                self.assertHttp(r, 200, 'application/x-json-stream')
+                self.assertEqual([ json.loads(line) for line in r.iter_lines() if line ], [row])
+                r = self.session.get(path, headers={"Accept": "text/csv"})
+                self.assertHttp(r, 200, 'text/csv')
+                self.assertEqual(list(r.iter_lines())[1:], ['%(id)d,%(name)s' % row])
+
 class ZTextFacet (common.ErmrestTest):
     # spelled this to run it very late in the sequence...
     def test_textfacet(self):
@@ -142,5 +142,45 @@ class MultiKeyReference (common.ErmrestTest):
         # regression test for ermrest#160, internal server error with MultiKeyReference
         self.assertHttp(self.session.get('entity/%(S)s:%(T1)s/%(S)s:%(T2b)s' % {'T1': _T1, 'T2b': _T2b, 'S': _S}), 200)
 
+def add_functional_tests(klass):
+    # inner joins toward referenced rows cannot repeat the context entity,
+    # other paths must still drop repeats via DISTINCT ON
+    parts = {
+        'T1': '%s:%s' % (_S, _T1),
+        'T2': '%s:%s' % (_S, _T2),
+    }
+    for expected, path, name in [
+            # functional: each T2 row joins at most one T1 row
+            ([1, 2, 3, 4], "%(T1)s/%(T2)s", "fn"),
+            ([1, 2, 3, 4], "A:=%(T2)s/%(T1)s/$A", "fn_ctx"),
+            ([1, 2], "%(T1)s/%(T2)s@sort(id)?limit=2", "fn_page1"),
+            ([3, 4], "%(T1)s/%(T2)s@sort(id)@after(2)?limit=2", "fn_page2"),
+            ([2, 1], "%(T1)s/%(T2)s@sort(id::desc::)@after(3)?limit=2", "fn_page2_desc"),
+            ([2, 3], "%(T1)s/%(T2)s@sort(id)@before(4)?limit=2", "fn_before"),
+            ([3, 2], "%(T1)s/%(T2)s@sort(level1_id::desc::,id::desc::)@after(3,4)?limit=2", "fn_page_fkey"),
+            # non-functional: T1 row 1 joins two T2 rows
+            ([1, 2, 3], "%(T2)s/%(T1)s", "nonfn"),
+            ([1, 2, 3], "A:=%(T1)s/%(T2)s/$A", "nonfn_ctx"),
+            ([1, 2, 3, 4], "A:=%(T1)s/left(id)=(%(T2)s:level1_id)/$A", "nonfn_outer"),
+            ([1, 2], "%(T2)s/%(T1)s@sort(id)?limit=2", "nonfn_page1"),
+            ([2, 3], "%(T2)s/%(T1)s@sort(id)@after(1)?limit=2", "nonfn_page2"),
+            ([2, 3], "%(T2)s/%(T1)s@sort(id)@before(::null::)?limit=2", "nonfn_before"),
+            ([2, 3, 1], "%(T2)s/%(T1)s@sort(name)", "nonfn_sort"),
+    ]:
+        url = 'entity/%s' % (path % parts)
+        setattr(klass, 'test_%s' % name, lambda self: self._check_ids(url, expected))
+    return klass
+
+@add_functional_tests
+class FunctionalPaths (common.ErmrestTest):
+    def _check_ids(self, path, expected):
+        r = self.session.get(path)
+        self.assertHttp(r, 200, 'application/json')
+        actual = [ row['id'] for row in r.json() ]
+        if '@sort' not in path:
+            # unsorted results come in any order but must not repeat rows
+            actual.sort()
+        self.assertEqual(actual, expected, path)
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
@@ -4,6 +4,7 @@ import common
 
 _S = 'paging'
 _T = 'pagedata'
+_T2 = 'pagekeys'
 _defs = {
     "schemas": {
         _S: {
@@ -16,6 +17,16 @@ _defs = {
                         { "type": { "typename": "int4" }, "name": "value" }
                     ],
                     "keys": [ { "unique_columns": [ "id" ] } ]
+                },
+                _T2: {
+                    "kind": "table",
+                    "column_definitions": [
+                        { "type": { "typename": "serial4" }, "name": "id", "nullok": False },
+                        { "type": { "typename": "int4" }, "name": "a", "nullok": False },
+                        { "type": { "typename": "int4" }, "name": "b", "nullok": False },
+                        { "type": { "typename": "int4" }, "name": "n" }
+                    ],
+                    "keys": [ { "unique_columns": [ "id" ] }, { "unique_columns": [ "a", "b" ] } ]
                 }
             }
         }
@@ -40,12 +51,20 @@ _data = [
     {}
 ]
 
+# a and b are NOT NULL, n is nullable
+_keydata = [
+    {"a": a, "b": b, "n": None if (a + b) % 3 == 1 else a * 3 + b}
+    for a in range(4)
+    for b in range(4)
+]
+
 def setUpModule():
     r = common.primary_session.get('schema/%s' % _S)
     if r.status_code == 404:
         # idempotent because unittest can re-enter module several times...
         common.primary_session.post('schema', json=_defs).raise_for_status()
         common.primary_session.post('entity/%s:%s?defaults=id' % (_S, _T), json=_data).raise_for_status()
+        common.primary_session.post('entity/%s:%s?defaults=id' % (_S, _T2), json=_keydata).raise_for_status()
 
 def add_paging_tests(klass):
     # generate many paging variants
@@ -157,6 +176,88 @@ class PagingJson (common.ErmrestTest):
     def _count(self, r):
         return len(r.json())
 
+def _cmp_sortkey(sortvec, r1, r2):
+    # ASC NULLS LAST and DESC NULLS FIRST like the service
+    for col, descending in sortvec:
+        v1, v2 = r1[col], r2[col]
+        if v1 == v2:
+            continue
+        elif v1 is None:
+            c = 1
+        elif v2 is None:
+            c = -1
+        else:
+            c = cmp(v1, v2)
+        return -c if descending else c
+    return 0
+
+def add_keyset_tests(klass):
+    # sort keys mixing NOT NULL and nullable columns in both directions
+    sorts = [
+        ("asc_notnull",  [("a", False), ("b", False)]),
+        ("desc_notnull", [("a", True), ("b", True)]),
+        ("mixed_notnull", [("a", False), ("b", True)]),
+        ("asc_nullable", [("a", False), ("n", False), ("b", False)]),
+        ("desc_nullable", [("a", True), ("n", True), ("b", True)]),
+        ("lead_nullable", [("n", False), ("a", False), ("b", False)]),
+        ("lead_nullable_desc", [("n", True), ("a", True), ("b", True)]),
+    ]
+
+    boundaries = [
+        ("low",  {"a": 0, "b": 2, "n": 2}),
+        ("mid",  {"a": 2, "b": 1, "n": None}),
+        ("high", {"a": 3, "b": 0, "n": 9}),
+        ("null", {"a": None, "b": None, "n": None}),
+    ]
+
+    queries = [
+        ("entity", "entity/%s" % _T2),
+        ("attribute", "attribute/%s/a,b,n" % _T2),
+    ]
+
+    def literal(v):
+        return '::null::' if v is None else '%d' % v
+
+    def add(qname, query, sname, sortvec, bname, boundary, is_before, limit):
+        def cmp_rows(r1, r2):
+            return _cmp_sortkey(sortvec, r1, r2)
+        rows = sorted(_keydata, cmp=cmp_rows)
+        if is_before:
+            expected = [ r for r in rows if cmp_rows(r, boundary) < 0 ][-limit:]
+        else:
+            expected = [ r for r in rows if cmp_rows(r, boundary) > 0 ][:limit]
+        path = '%s@sort(%s)@%s(%s)?limit=%d' % (
+            query,
+            ','.join([ '%s%s' % (col, '::desc::' if descending else '') for col, descending in sortvec ]),
+            'before' if is_before else 'after',
+            ','.join([ literal(boundary[col]) for col, descending in sortvec ]),
+            limit
+        )
+        setattr(
+            klass,
+            'test_%s_%s_%s_%s' % (qname, sname, 'before' if is_before else 'after', bname),
+            lambda self: self._check_page(path, expected)
+        )
+
+    for qname, query in queries:
+        for sname, sortvec in sorts:
+            for bname, boundary in boundaries:
+                for is_before in [False, True]:
+                    add(qname, query, sname, sortvec, bname, boundary, is_before, 5)
+
+    return klass
+
+@add_keyset_tests
+class PagingKeyset (common.ErmrestTest):
+    def _check_page(self, path, expected):
+        r = self.session.get(path)
+        self.assertHttp(r, 200, 'application/json')
+        self.assertEqual(
+            [ (row['a'], row['b'], row['n']) for row in r.json() ],
+            [ (row['a'], row['b'], row['n']) for row in expected ],
+            path
+        )
+
 class PagingJsonStream (PagingJson):
     content_type = 'application/x-json-stream'
     def _count(self, r):
@@ -107,5 +107,37 @@ class PreconditionData2 (PreconditionData1):
     # run this whole sequence twice...
     pass
 
+class ModelReadAfterWrite (common.ErmrestTest):
+    """Each model change must be visible to the very next request."""
+    table = 'read_after_write'
+    tdef = {
+        "table_name": table,
+        "column_definitions": [
+            { "type": { "typename": "int8" }, "name": "id", "nullok": False },
+            { "type": { "typename": "text" }, "name": "name" }
+        ],
+        "keys": [ { "unique_columns": [ "id" ] } ]
+    }
+
+    def test_table_lifecycle(self):
+        tpath = 'schema/%s/table/%s' % (_S, self.table)
+        epath = 'entity/%s:%s' % (_S, self.table)
+        # repeat to make a lost race with change notifications likely
+        for i in range(5):
+            r = self.session.post('schema/%s/table' % _S, json=self.tdef)
+            self.assertHttp(r, 201)
+            etag = r.headers['etag']
+            r = self.session.get(tpath)
+            self.assertHttp(r, 200)
+            self.assertEqual(r.headers['etag'], etag)
+            self.assertHttp(self.session.get(epath), 200)
+            self.assertHttp(self.session.post('schema/%s/table/%s/column' % (_S, self.table), json={"name": "extra", "type": {"typename": "text"}}), 201)
+            self.assertHttp(self.session.get('attribute/%s:%s/extra' % (_S, self.table)), 200)
+            self.assertHttp(self.session.delete('schema/%s/table/%s/column/extra' % (_S, self.table)), 204)
+            self.assertHttp(self.session.get('attribute/%s:%s/extra' % (_S, self.table)), 409)
+            self.assertHttp(self.session.delete(tpath), 204)
+            self.assertHttp(self.session.get(tpath), 404)
+            self.assertHttp(self.session.get(epath), 409)
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
@@ -84,3 +84,75 @@ for url in [
     if not got_error:
         raise ValueError('negative test did not raise expected ParseError for: %s' % url)
 
+
+# concurrent parsing tests: threads sharing one parse function must get
+# the same results as serial parsing
+
+import threading
+from ermrest.url.parse import make_parse
+from ermrest.url.ir import Node
+
+def ir_key(v):
+    if isinstance(v, Node):
+        slots = [ s for c in type(v).__mro__ for s in getattr(c, '__slots__', ()) ]
+        return (type(v).__name__,) + tuple([ ir_key(getattr(v, s)) for s in slots ])
+    elif isinstance(v, (list, tuple)):
+        return tuple([ ir_key(i) for i in v ])
+    else:
+        return repr(v)
+
+def parse_key(parse, url):
+    try:
+        return ir_key(parse(url))
+    except Exception, e:
+        return type(e).__name__
+
+concurrent_urls = [
+    '/ermrest/catalog/232/schema/S1/table/T1/column/C1',
+] + [
+    '/ermrest/catalog/232/entity/S1:T1/C1=1/C2::gt::%d' % i
+    for i in range(20)
+] + [
+    '/ermrest/catalog/232/attribute/S1:T1/A:=S2:T2/C1,A:C2@sort(C1::desc::)@after(%d)?limit=10' % i
+    for i in range(20)
+] + [
+    '/ermrest/catalog/232/attributegroup/S1:T1/C1;n:=cnt(*)',
+    '/ermrest/catalog/232/entity/S1:T1/C1=1/(',
+    '/ermrest/catalog/232/entity',
+]
+
+parse = make_parse()
+expected = [ parse_key(parse, url) for url in concurrent_urls ]
+failures = []
+
+def worker():
+    for repeat in range(20):
+        for i in range(len(concurrent_urls)):
+            if parse_key(parse, concurrent_urls[i]) != expected[i]:
+                failures.append(concurrent_urls[i])
+
+threads = [ threading.Thread(target=worker) for i in range(8) ]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+
+if failures:
+    raise ValueError('concurrent parse results differ from serial ones for: %s' % sorted(set(failures)))
+
+
+# installed parser tables must match the current grammar, otherwise
+# every service process silently rebuilds them at startup
+
+import ply.yacc
+from ermrest.url import lex as url_lex, parse as url_parse
+import ermrest.url.url_lextab as url_lextab
+import ermrest.url.url_parsetab as url_parsetab
+
+if getattr(url_lextab, '_lexsignature', None) != url_lex.lexer_signature():
+    raise ValueError('installed lexer tables are stale')
+
+pinfo = ply.yacc.ParserReflect(vars(url_parse))
+pinfo.get_all()
+if url_parsetab._lr_signature != pinfo.signature():
+    raise ValueError('installed parser tables are stale')